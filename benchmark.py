@@ -0,0 +1,483 @@
+"""
+Benchmark of the MODFLOW-OWHM2 output readers and comparators.
+
+Synthetic binary head, cell by cell budget, listing, FB_DETAILS and SWR
+reach group budget files of a configurable grid size, number of time
+steps, farms and SWR reaches are written to a workspace, with a second
+"valid" copy of each file that is perturbed below the comparison
+tolerances. Each reader and comparator is then timed and memory
+profiled, and the results are saved as json so they can be tracked
+between versions.
+
+usage: python benchmark.py [--nlay N] [--nrow N] [--ncol N] [--ntime N]
+                           [--nfarm N] [--nreach N] [--repeat N] [--ws DIR]
+                           [--output FILE]
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import numpy as np
+
+import utilities as ut
+
+
+LIST_TERMS = ("STORAGE", "CONSTANT HEAD", "WELLS", "RECHARGE", "MNW2",
+              "FARM WELLS")
+
+FB_HEADER = ("PER", "STP", "DAYS", "DELT", "FID", "ACTIVE", "Q-PRECIP",
+             "Q-ET", "Q-WELLS", "Q-IN", "Q-OUT", "Q-IN-OUT",
+             "Q-DISCREPANCY[%]", "CROP_NAME")
+
+
+def write_head_file(filename, shape, perturb=0., seed=0):
+    """
+    Writes a single precision binary head file
+
+    :param filename: (str) head file name
+    :param shape: (tuple) ntime, nlay, nrow, ncol
+    :param perturb: (float) relative noise added to the heads
+    :param seed: (int) random seed of the heads, keep the seed to write a
+        perturbed copy of a head file
+    """
+    ntime, nlay, nrow, ncol = shape
+    rng = np.random.RandomState(seed)
+    noise = np.random.RandomState(seed + 1)
+    header = np.zeros(1, dtype=[('kstp', '<i4'), ('kper', '<i4'),
+                                ('pertim', '<f4'), ('totim', '<f4'),
+                                ('text', 'S16'), ('ncol', '<i4'),
+                                ('nrow', '<i4'), ('ilay', '<i4')])
+    header['text'] = b'            HEAD'
+    header['ncol'] = ncol
+    header['nrow'] = nrow
+    with open(filename, 'wb') as f:
+        for t in range(ntime):
+            header['kstp'] = 1
+            header['kper'] = t + 1
+            header['pertim'] = 1.
+            header['totim'] = t + 1.
+            for k in range(nlay):
+                head = 100. + 10. * rng.random_sample((nrow, ncol))
+                if perturb:
+                    head *= 1. + perturb * noise.standard_normal((nrow, ncol))
+
+                header['ilay'] = k + 1
+                f.write(header.tobytes())
+                f.write(head.astype('<f4').tobytes())
+
+
+def write_budget_file(filename, shape, nwell, perturb=0., seed=0):
+    """
+    Writes a single precision compact cell by cell budget file with a
+    full 3D STORAGE term (imeth 1) and a list style WELLS term (imeth 2)
+
+    :param filename: (str) budget file name
+    :param shape: (tuple) ntime, nlay, nrow, ncol
+    :param nwell: (int) number of wells in the WELLS term
+    :param perturb: (float) relative noise added to the budget terms
+    :param seed: (int) random seed of the budget terms
+    """
+    ntime, nlay, nrow, ncol = shape
+    rng = np.random.RandomState(seed)
+    noise = np.random.RandomState(seed + 1)
+    ncell = nlay * nrow * ncol
+    nwell = min(nwell, ncell)
+    nodes = np.sort(rng.choice(ncell, nwell, replace=False)) + 1
+    wells = np.zeros(nwell, dtype=[('node', '<i4'), ('q', '<f4')])
+    wells['node'] = nodes
+
+    def write_header(f, t, text, imeth):
+        f.write(np.array([1, t + 1], dtype='<i4').tobytes())
+        f.write(text.rjust(16).encode('ascii'))
+        f.write(np.array([ncol, nrow, -nlay, imeth], dtype='<i4').tobytes())
+        f.write(np.array([1., 1., t + 1.], dtype='<f4').tobytes())
+
+    with open(filename, 'wb') as f:
+        for t in range(ntime):
+            storage = rng.standard_normal(ncell)
+            q = -100. * rng.random_sample(nwell)
+            if perturb:
+                storage *= 1. + perturb * noise.standard_normal(ncell)
+                q *= 1. + perturb * noise.standard_normal(nwell)
+
+            write_header(f, t, "STORAGE", 1)
+            f.write(storage.astype('<f4').tobytes())
+
+            write_header(f, t, "WELLS", 2)
+            f.write(np.array([nwell], dtype='<i4').tobytes())
+            wells['q'] = q
+            f.write(wells.tobytes())
+
+
+def write_list_file(filename, ntime, perturb=0., seed=0):
+    """
+    Writes a listing file with a volumetric budget and a time summary for
+    each time step, stress period t is t days long
+
+    :param filename: (str) listing file name
+    :param ntime: (int) number of time steps
+    :param perturb: (float) relative noise added to the budget terms
+    :param seed: (int) random seed of the budget terms
+    """
+    rng = np.random.RandomState(seed)
+    noise = np.random.RandomState(seed + 1)
+    line = "{:>20s} ={:17.4f}     {:>20s} ={:17.4f}\n"
+    time_line = "{:>19s} " + "{:<12.5G}" * 4 + "{:.5G}\n"
+    units = np.array([86400., 1440., 24., 1., 1. / 365.25])
+    with open(filename, 'w') as f:
+        f.write(" MODFLOW-OWHM synthetic benchmark listing file\n")
+        for t in range(ntime):
+            rates = 1000. * rng.random_sample((2, len(LIST_TERMS)))
+            if perturb:
+                rates *= 1. + perturb * noise.standard_normal(rates.shape)
+
+            f.write("\n  VOLUMETRIC BUDGET FOR ENTIRE MODEL AT END OF TIME "
+                    "STEP{:5d}, STRESS PERIOD{:4d}\n".format(1, t + 1))
+            f.write("  " + "-" * 78 + "\n\n")
+            f.write("     CUMULATIVE VOLUMES      L**3       RATES FOR THIS "
+                    "TIME STEP      L**3/T\n\n")
+            for tag, values in (("IN", rates[0]), ("OUT", rates[1])):
+                f.write("{:>15s}:{:>41s}:\n".format(tag, tag))
+                for name, value in zip(LIST_TERMS, values):
+                    f.write(line.format(name, value * (t + 1), name, value))
+
+                total = "TOTAL " + tag
+                f.write("\n" + line.format(total, values.sum() * (t + 1),
+                                           total, values.sum()) + "\n")
+
+            diff = rates[0].sum() - rates[1].sum()
+            f.write(line.format("IN - OUT", diff * (t + 1), "IN - OUT", diff))
+            f.write("\n" + line.format("PERCENT DISCREPANCY", 0.,
+                                       "PERCENT DISCREPANCY", 0.) + "\n")
+
+            f.write("\n{:>41s}{:5d} IN STRESS PERIOD{:4d}\n".format(
+                "TIME SUMMARY AT END OF TIME STEP", 1, t + 1))
+            f.write(" " * 20 + "SECONDS     MINUTES      HOURS       DAYS"
+                               "        YEARS\n")
+            f.write(" " * 20 + "-" * 59 + "\n")
+            for name, days in (("TIME STEP LENGTH", t + 1.),
+                               ("STRESS PERIOD TIME", t + 1.),
+                               ("TOTAL TIME", (t + 1.) * (t + 2.) / 2.)):
+                f.write(time_line.format(name, *(days * units)))
+
+
+def write_fb_details(filename, ntime, nfarm, perturb=0., seed=0):
+    """
+    Writes an FB_DETAILS farm process output file
+
+    :param filename: (str) FB_DETAILS file name
+    :param ntime: (int) number of stress periods, with two time steps each
+    :param nfarm: (int) number of farms
+    :param perturb: (float) relative noise added to the farm budgets
+    :param seed: (int) random seed of the farm budgets
+    """
+    rng = np.random.RandomState(seed)
+    noise = np.random.RandomState(seed + 1)
+    nstp = 2
+    nrows = ntime * nstp * nfarm
+    per = np.repeat(np.arange(1, ntime + 1), nstp * nfarm)
+    stp = np.tile(np.repeat(np.arange(1, nstp + 1), nfarm), ntime)
+    fid = np.tile(np.arange(1, nfarm + 1), ntime * nstp)
+    delt = np.full(nrows, 15.)
+    days = 15. * (np.repeat(np.arange(ntime * nstp), nfarm) + 1)
+    flows = 1000. * rng.random_sample((nrows, 3))
+    if perturb:
+        flows *= 1. + perturb * noise.standard_normal(flows.shape)
+
+    qin = flows.sum(axis=1)
+    table = np.column_stack([per, stp, days, delt, fid, np.ones(nrows),
+                             flows[:, 0], -flows[:, 1], flows[:, 2],
+                             qin, -qin, np.zeros(nrows), np.zeros(nrows)])
+    fmt = ["%5d", "%5d", "%12.4f", "%10.4f", "%6d", "%3d", "%14.6E",
+           "%14.6E", "%14.6E", "%14.6E", "%14.6E", "%14.6E", "%10.4f"]
+    with open(filename, 'w') as f:
+        f.write(" ".join(FB_HEADER) + "\n")
+        lines = [" ".join(fmt) % tuple(row) for row in table]
+        f.write("\n".join("{}  CROP{}".format(line, int(farm))
+                          for line, farm in zip(lines, fid)) + "\n")
+
+
+def write_swr_file(filename, ntime, nreach, perturb=0., seed=0,
+                   swrtype='budget', precision='double'):
+    """
+    Writes an SWR process binary output file. Flow files connect each
+    reach to the next one, exchange and structure files list one or two
+    items for alternating reaches.
+
+    :param filename: (str) SWR output file name
+    :param ntime: (int) number of time steps, with one SWR time step each
+    :param nreach: (int) number of reaches or reach groups
+    :param perturb: (float) relative noise added to the values
+    :param seed: (int) random seed of the values
+    :param swrtype: (str) stage, budget, flow, exchange or structure
+    :param precision: (str) single or double
+    """
+    rng = np.random.RandomState(seed)
+    noise = np.random.RandomState(seed + 1)
+    real = '<f8' if precision == 'double' else '<f4'
+    nvalue = len(ut.SwrBinaryFile.items[swrtype][0])
+    header = np.dtype([('totim', real), ('dt', real), ('kper', '<i4'),
+                       ('kstp', '<i4'), ('kswr', '<i4')])
+    items = np.arange(nreach) % 2 + 1
+    nitem = nreach
+    if swrtype in ('exchange', 'structure'):
+        nitem = int(items.sum())
+
+    record = [('value', real, (nvalue,))]
+    if swrtype == 'exchange':
+        record.insert(0, ('layer', '<i4'))
+
+    data = np.zeros(nitem, dtype=record)
+    if swrtype == 'exchange':
+        data['layer'] = np.concatenate([np.arange(1, n + 1) for n in items])
+
+    with open(filename, 'wb') as f:
+        if swrtype == 'flow':
+            conn = np.column_stack((np.ones(nreach), np.arange(1, nreach + 1),
+                                    np.arange(1, nreach + 1) % nreach + 1))
+            np.array([nreach, nreach], dtype='<i4').tofile(f)
+            conn.astype('<i4').tofile(f)
+
+        else:
+            np.array([nreach], dtype='<i4').tofile(f)
+
+        for t in range(ntime):
+            if swrtype in ('exchange', 'structure'):
+                items.astype('<i4').tofile(f)
+
+            np.array([(t + 1., 1., t + 1, 1, 1)], dtype=header).tofile(f)
+            values = 1000. * rng.random_sample((nitem, nvalue))
+            if perturb:
+                values *= 1. + perturb * noise.standard_normal(values.shape)
+
+            data['value'] = values
+            data.tofile(f)
+
+
+def generate(ws, nlay, nrow, ncol, ntime, nfarm, nreach=1000,
+             perturb=1e-4):
+    """
+    Writes the simulated and valid synthetic output files
+
+    :param ws: (str) benchmark workspace
+    :param nlay, nrow, ncol: (int) grid size
+    :param ntime: (int) number of time steps
+    :param nfarm: (int) number of farms
+    :param nreach: (int) number of SWR reach groups
+    :param perturb: (float) relative noise of the valid outputs
+    :return: (tuple) simulated workspace, valid workspace
+    """
+    shape = (ntime, nlay, nrow, ncol)
+    nwell = max(1, nlay * nrow * ncol // 100)
+    sim_ws = os.path.join(ws, "sim")
+    valid_ws = os.path.join(ws, "valid")
+    for out_ws, noise in ((sim_ws, 0.), (valid_ws, perturb)):
+        if not os.path.isdir(out_ws):
+            os.makedirs(out_ws)
+
+        write_head_file(os.path.join(out_ws, "bench.hds"), shape, noise)
+        write_budget_file(os.path.join(out_ws, "bench.cbc"), shape, nwell,
+                          noise)
+        write_list_file(os.path.join(out_ws, "bench.lst"), ntime, noise)
+        write_fb_details(os.path.join(out_ws, "FB_DETAILS.OUT"), ntime,
+                         nfarm, noise)
+        write_swr_file(os.path.join(out_ws, "bench.rgb"), ntime, nreach,
+                       noise)
+
+    return sim_ws, valid_ws
+
+
+def measure(func, repeat=1):
+    """
+    Times and memory profiles a benchmark stage
+
+    :param func: callable, the stage to run
+    :param repeat: (int) number of runs, the fastest run is reported
+    :return: (dict) seconds of each run, fastest run and peak traced
+        memory in bytes (None if tracemalloc is not available)
+    """
+    seconds = []
+    peak = None
+    for _ in range(repeat):
+        gc.collect()
+        if tracemalloc is not None:
+            tracemalloc.start()
+
+        t0 = time.time()
+        func()
+        seconds.append(time.time() - t0)
+
+        if tracemalloc is not None:
+            peak = max(peak or 0, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+    return {"seconds": seconds,
+            "best": min(seconds),
+            "peak_bytes": peak}
+
+
+def load_head(ws):
+    head = ut.HeadFile(ws=ws, headname="bench.hds")
+    return np.asarray(head.head)
+
+
+def load_budget(ws):
+    budget = ut.CellByCellBudget(ws=ws, budgetname="bench.cbc")
+    for key in budget.keys():
+        budget[key]
+
+    return budget
+
+
+def load_list(ws):
+    return ut.ListBudget(ws=ws, listname="bench.lst")
+
+
+def load_farm(ws):
+    farm = ut.FarmOutputs(ws=ws, outname="FB_DETAILS.OUT")
+    farm.raw_to_stress_period()
+    return farm
+
+
+def load_swr(ws):
+    return ut.SwrBinaryFile(ws=ws, swrname="bench.rgb")
+
+
+def run(sim_ws, valid_ws, repeat=1):
+    """
+    Runs every reader and comparator benchmark stage
+
+    :param sim_ws: (str) simulated output workspace
+    :param valid_ws: (str) valid output workspace
+    :param repeat: (int) number of runs of each stage
+    :return: list of stage result dicts
+    """
+    stages = [
+        ("HeadFile", "bench.hds", lambda: load_head(valid_ws)),
+        ("CellByCellBudget", "bench.cbc", lambda: load_budget(valid_ws)),
+        ("ListBudget", "bench.lst", lambda: load_list(valid_ws)),
+        ("FarmOutputs", "FB_DETAILS.OUT", lambda: load_farm(valid_ws)),
+        ("SwrBinaryFile", "bench.rgb", lambda: load_swr(valid_ws)),
+        ("array_compare", "bench.hds",
+         lambda: ut.array_compare(load_head(sim_ws), load_head(valid_ws),
+                                  cell_tol=0.05, array_tol=0.05)),
+        ("array_compare_stream", "bench.hds",
+         lambda: ut.array_compare(ut.HeadFile(sim_ws, "bench.hds").head,
+                                  ut.HeadFile(valid_ws, "bench.hds").head,
+                                  cell_tol=0.05, array_tol=0.05,
+                                  stream=True)),
+        ("budget_compare_cbc", "bench.cbc",
+         lambda: ut.budget_compare(load_budget(sim_ws),
+                                   load_budget(valid_ws),
+                                   incremental_tolerance=0.05,
+                                   budget_tolerance=0.05)),
+        ("budget_compare_list", "bench.lst",
+         lambda: ut.budget_compare(load_list(sim_ws), load_list(valid_ws),
+                                   incremental_tolerance=0.05,
+                                   budget_tolerance=0.05)),
+        ("farm_outputs_compare", "FB_DETAILS.OUT",
+         lambda: ut.farm_outputs_compare(load_farm(sim_ws),
+                                         load_farm(valid_ws),
+                                         incremental_tolerance=0.05,
+                                         budget_tolerance=0.05)),
+        ("swr_compare", "bench.rgb",
+         lambda: ut.swr_compare(load_swr(sim_ws), load_swr(valid_ws),
+                                cell_tol=0.05, array_tol=0.05)),
+    ]
+
+    results = []
+    for stage, name, func in stages:
+        result = measure(func, repeat)
+        result["stage"] = stage
+        result["file"] = name
+        result["file_bytes"] = os.path.getsize(os.path.join(valid_ws, name))
+        results.append(result)
+        print("{:<24s} {:10.3f}s {:>14s} peak bytes".format(
+            stage, result["best"], str(result["peak_bytes"])))
+
+    return results
+
+
+def get_version():
+    """
+    Method to get the git commit of the benchmarked code, if available
+
+    :return: (str) commit hash or None
+    """
+    try:
+        out = subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                      cwd=os.path.dirname(
+                                          os.path.abspath(__file__)),
+                                      stderr=subprocess.STDOUT)
+        return out.decode('ascii').strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--nlay", type=int, default=3)
+    parser.add_argument("--nrow", type=int, default=200)
+    parser.add_argument("--ncol", type=int, default=200)
+    parser.add_argument("--ntime", type=int, default=50,
+                        help="number of time steps")
+    parser.add_argument("--nfarm", type=int, default=100)
+    parser.add_argument("--nreach", type=int, default=1000,
+                        help="number of SWR reach groups")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="number of runs of each stage")
+    parser.add_argument("--ws", default=None,
+                        help="workspace for the synthetic files, a temporary "
+                             "directory is used and removed by default")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="json results file name")
+    args = parser.parse_args(argv)
+
+    ws = args.ws or tempfile.mkdtemp(prefix="owhm2_bench_")
+    ut.ErrorFile(error_name=os.path.join(ws, "benchmark_error.txt"))
+    try:
+        t0 = time.time()
+        sim_ws, valid_ws = generate(ws, args.nlay, args.nrow, args.ncol,
+                                    args.ntime, args.nfarm, args.nreach)
+        print("generated synthetic outputs in {:.3f}s".format(
+            time.time() - t0))
+        results = run(sim_ws, valid_ws, max(1, args.repeat))
+
+    finally:
+        ut.ErrorFile.close()
+        if args.ws is None:
+            shutil.rmtree(ws, ignore_errors=True)
+
+    config = dict((key, getattr(args, key))
+                  for key in ("nlay", "nrow", "ncol", "ntime", "nfarm",
+                              "nreach", "repeat"))
+    meta = {"date": datetime.datetime.now().isoformat(),
+            "commit": get_version(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform()}
+
+    with open(args.output, "w") as f:
+        json.dump({"meta": meta, "config": config, "results": results}, f,
+                  indent=2)
+
+    print("results: {}".format(args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
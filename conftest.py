@@ -0,0 +1,37 @@
+import utilities as ut
+
+
+def pytest_addoption(parser):
+    parser.addoption("--suite", action="append", default=None,
+                     help="manifest suite to compare, can be repeated. "
+                          "All suites are compared by default")
+    parser.addoption("--profile", default=None, metavar="FILE",
+                     help="record the time, bytes read and peak memory of "
+                          "each reader and comparison and save them to a "
+                          "json FILE")
+    parser.addoption("--dump-failures", action="store_true", default=False,
+                     help="save the full table of failing cells of each "
+                          "failed comparison as a .npy file next to the "
+                          "suite error file")
+
+
+def pytest_configure(config):
+    ut.ErrorFile.dump_failures = config.getoption("dump_failures")
+    if config.getoption("profile"):
+        ut.Profiler.enable()
+
+
+def pytest_runtest_setup(item):
+    ut.Profiler.test = item.nodeid
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    filename = config.getoption("profile")
+    if not filename:
+        return
+
+    ut.Profiler.disable()
+    ut.Profiler.save(filename)
+    terminalreporter.write_sep("=", "reader and comparison profile")
+    terminalreporter.write(ut.Profiler.format())
+    terminalreporter.write_line("profile saved to {}".format(filename))
@@ -0,0 +1,235 @@
+"""
+Manifest of the MODFLOW-OWHM2 comparison suites.
+
+Each suite lists its simulated (OWHM2) and valid output workspaces, the
+file name patterns of each output type to compare and the comparison
+tolerances. Suites with "active_cells" set compare heads on the active
+cells of the valid model only, skipping cells that are no flow or dry in
+every time step.
+
+Suites with "lgr" set hold local grid refinement runs. The parent and
+child grid outputs of a run are compared as one job with a result per
+grid. Files are grouped into runs by the first group of an "lgr" regular
+expression, lgr True uses LGR_RUN, which groups parent and child files by
+the run name in front of "parent" or "child".
+
+Output files are discovered from the valid workspace when the tests are
+collected, so adding an example problem only takes a new entry. Each
+valid workspace is listed once per session through
+utilities.WorkspaceIndex, which also classifies the files so a name
+pattern such as ".out" only matches outputs of the right type.
+
+Output types are:
+    list: listing file budgets, compared with budget_compare
+    budget: cell by cell budget files, compared with budget_compare
+    head: binary or formatted head files, compared with array_compare
+    fds, fbdetails: farm process outputs, compared with farm_outputs_compare
+    swr: SWR process binary stage, reach group budget, flow, exchange and
+        structure files, compared with swr_compare
+"""
+import os
+import re
+
+import utilities as ut
+
+
+script_ws = os.path.dirname(os.path.abspath(__file__))
+
+KINDS = ("list", "budget", "head", "fds", "fbdetails", "swr")
+
+TOLERANCE = {"incremental_tolerance": 0.05,
+             "budget_tolerance": 0.05,
+             "cell_tol": 0.05,
+             "array_tol": 0.05}
+
+# WorkspaceIndex file classes of each output type, discovered files that
+# are classified as another output type are not compared
+CLASSES = {"list": ("list",),
+           "budget": ("budget",),
+           "head": ("head", "formatted_head"),
+           "fds": ("fmp",),
+           "fbdetails": ("fmp",),
+           "swr": ("swr",)}
+
+# run name of LGR grid files such as parent.hds, child1.hds or
+# run2_child1.hds
+LGR_RUN = r"(?i)^(.*?)[_.-]?(?:parent|child\d*)(?:\.|$)"
+
+MODFLOW_FILES = {"list": ut.CommonExtentions.list_file,
+                 "budget": ut.CommonExtentions.budget_file,
+                 "head": ut.CommonExtentions.head_file}
+
+SUITES = [
+    {"name": "mf2005",
+     "error_file": "mf2005_error.txt",
+     "sim_ws": "OWHM_Example_Problems/test-out",
+     "valid_ws": "OWHM_Example_Problems/test-out-true",
+     "files": {"list": ut.CommonExtentions.list_file,
+               "budget": ut.CommonExtentions.budget_file,
+               "head": ut.CommonExtentions.head_file + [".out"]}},
+
+    {"name": "nwt",
+     "error_file": "nwt_error.txt",
+     "sim_ws": "OWHM_Example_Problems/test-out-nwt",
+     "valid_ws": "OWHM_Example_Problems/test-out-true-nwt",
+     "active_cells": True,
+     "files": MODFLOW_FILES},
+
+    {"name": "rip",
+     "error_file": "rip_error.txt",
+     "sim_ws": "OWHM_Example_Problems/test-out-rip",
+     "valid_ws": "OWHM_Example_Problems/test-out-true-rip",
+     "files": MODFLOW_FILES},
+
+    {"name": "swi",
+     "error_file": "swi_error.txt",
+     "sim_ws": "OWHM_Example_Problems/test-out-swi",
+     "valid_ws": "OWHM_Example_Problems/test-out-true-swi",
+     "files": MODFLOW_FILES},
+
+    {"name": "swr",
+     "error_file": "swr_error.txt",
+     "sim_ws": "OWHM_Example_Problems/test-out-swr",
+     "valid_ws": "OWHM_Example_Problems/test-out-true-swr",
+     "files": dict(MODFLOW_FILES, swr=ut.CommonExtentions.swr_file)},
+
+    {"name": "mfowhm",
+     "error_file": "mfowhm_error.txt",
+     "sim_ws": "OWHM_Example_Problems/OWHM_v1_vs_v2/v2/Output",
+     "valid_ws": "OWHM_Example_Problems/OWHM_v1_vs_v2/v1/Output",
+     # farm process outputs of version 1 are written to the model directory
+     "file_ws": {"fds": "OWHM_Example_Problems/OWHM_v1_vs_v2/v1",
+                 "fbdetails": "OWHM_Example_Problems/OWHM_v1_vs_v2/v1"},
+     "files": {"list": ut.CommonExtentions.list_file,
+               "budget": ["OWHM_EX1_CBC.out"],
+               "head": ["Head_save.out"],
+               "fds": ["fds.out"],
+               "fbdetails": ["fb_details.out"]}},
+
+    {"name": "fmp",
+     "error_file": "fmp_error.txt",
+     "sim_ws": "OWHM_Example_Problems/FMP2_Example_Model/test-out",
+     "valid_ws": "OWHM_Example_Problems/FMP2_Example_Model/test-out-true",
+     "files": MODFLOW_FILES},
+
+    {"name": "lgr_pcg",
+     "error_file": "lgr_pcg_error.txt",
+     "sim_ws": "OWHM_Example_Problems/test-run-owhm-lgr/fmp-lgr-lpf-test-out",
+     "valid_ws": "OWHM_Example_Problems/test-run-owhm-lgr/"
+                 "fmp-lgr-lpf-test-out-true",
+     "lgr": True,
+     "files": MODFLOW_FILES},
+
+    {"name": "lgr_nwt",
+     "error_file": "lgr_nwt_error.txt",
+     "sim_ws": "OWHM_Example_Problems/test-run-owhm-lgr/fmp-lgr-nwt-test-out",
+     "valid_ws": "OWHM_Example_Problems/test-run-owhm-lgr/"
+                 "fmp-lgr-nwt-test-out-true",
+     "lgr": True,
+     "files": MODFLOW_FILES},
+]
+
+
+def get_suite(name):
+    """
+    Method to get a suite entry from the manifest
+
+    :param name: (str) suite name
+    :return: (dict) suite entry
+    """
+    for suite in SUITES:
+        if suite["name"] == name:
+            return suite
+
+    raise KeyError("No comparison suite named {}".format(name))
+
+
+def get_workspaces(suite, kind):
+    """
+    Method to get the absolute simulated and valid workspaces of an
+    output type
+
+    :param suite: (dict) suite entry
+    :param kind: (str) output type
+    :return: (tuple) simulated workspace, valid workspace
+    """
+    valid_ws = suite.get("file_ws", {}).get(kind, suite["valid_ws"])
+    return (os.path.join(script_ws, suite["sim_ws"]),
+            os.path.join(script_ws, valid_ws))
+
+
+def get_tolerance(suite):
+    """
+    Method to get the comparison tolerances of a suite, suite entries only
+    need to set the tolerances that differ from the TOLERANCE defaults
+
+    :param suite: (dict) suite entry
+    :return: (dict) tolerances
+    """
+    tolerance = dict(TOLERANCE)
+    tolerance.update(suite.get("tolerance", {}))
+    return tolerance
+
+
+def group_lgr_runs(names, lgr=True):
+    """
+    Method to group the parent and child grid output files of LGR runs
+
+    :param names: (list) output file names
+    :param lgr: (bool or str) a regular expression groups files by its
+        first group, True uses LGR_RUN. Files that do not match are runs
+        of their own
+    :return: list of tuples of file names, one per run
+    """
+    if lgr is True:
+        lgr = LGR_RUN
+
+    runs = []
+    keys = {}
+    for name in names:
+        match = re.match(lgr, name)
+        key = match.group(1) if match else name
+        if key not in keys:
+            keys[key] = len(runs)
+            runs.append([])
+
+        runs[keys[key]].append(name)
+
+    return [tuple(run) for run in runs]
+
+
+def discover(names=None, kinds=KINDS):
+    """
+    Generator of the output files to compare. Only the workspaces of the
+    requested suites are scanned, when the generator is consumed.
+
+    :param names: (list) suite names, defaults to all suites
+    :param kinds: (list) output types
+    :return: (suite name, output type, file name) tuples. File name is
+        None if the valid workspace does not exist and is a tuple of the
+        grid file names of a run in LGR suites
+    """
+    for suite in SUITES:
+        if names is not None and suite["name"] not in names:
+            continue
+
+        for kind in kinds:
+            patterns = suite["files"].get(kind, [])
+            if not patterns:
+                continue
+
+            valid_ws = get_workspaces(suite, kind)[1]
+            if not os.path.isdir(valid_ws):
+                yield suite["name"], kind, None
+                continue
+
+            files = []
+            for pattern in patterns:
+                files += ut.get_file_names(valid_ws, filter=pattern,
+                                           classes=CLASSES.get(kind))
+
+            if suite.get("lgr"):
+                files = group_lgr_runs(files, suite["lgr"])
+
+            for name in files:
+                yield suite["name"], kind, name
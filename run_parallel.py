@@ -0,0 +1,198 @@
+"""
+Parallel runner for the MODFLOW-OWHM2 comparison suites.
+
+Every (suite, file type, file name) comparison of the manifest suites is
+independent, so each one is run as a separate job on a process pool sized
+to the machine. The grids of an LGR run are separate jobs too, their
+results are combined into one verdict per run. Worker processes send
+their error messages to the ErrorFile writer of the parent process, which
+writes each suite's error file in job order, and job results are
+collected into one report.
+
+usage: python run_parallel.py [-n PROCESSES] [--report FILE]
+                              [--dump-failures] [suite ...]
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+import traceback
+
+import manifest
+import test_suites
+import utilities as ut
+
+
+SUITES = tuple(suite["name"] for suite in manifest.SUITES)
+
+
+def collect_jobs(suites=SUITES):
+    """
+    Collects one job per output file of the manifest suites, suites with a
+    missing valid workspace are skipped. Each grid of an LGR run is a job
+    of its own.
+
+    :param suites: (list) manifest suite names
+    :return: (tuple) list of (suite, output type, file name) jobs, list
+        of (suite, output type, grid file names) LGR runs
+    """
+    jobs = []
+    runs = []
+    for suite, kind, name in manifest.discover(suites):
+        if name is None:
+            continue
+
+        if isinstance(name, tuple):
+            runs.append((suite, kind, name))
+            jobs += [(suite, kind, grid) for grid in name]
+
+        else:
+            jobs.append((suite, kind, name))
+
+    return jobs, runs
+
+
+def combine_lgr_runs(jobs, runs, results):
+    """
+    Combines the grid job results of each LGR run into one run verdict,
+    the grid results are reported to the suite error file after the
+    grids of the run
+
+    :param jobs: (list) jobs from collect_jobs()
+    :param runs: (list) LGR runs from collect_jobs()
+    :param results: (list) run_job results, in job order
+    :return: list of (run, pass/fail, wall time of the slowest grid)
+    """
+    index = dict((job, ix) for ix, job in enumerate(jobs))
+    combined = []
+    for suite, kind, names in runs:
+        grids = [index[(suite, kind, name)] for name in names]
+        ut.ErrorFile.key = max(grids)
+        try:
+            test_suites.report_lgr_run(manifest.get_suite(suite), names,
+                                       [results[ix][1] for ix in grids])
+            passed = True
+
+        except AssertionError:
+            passed = False
+
+        combined.append(((suite, kind, names), passed,
+                         max([results[ix][2] for ix in grids])))
+
+    ut.ErrorFile.key = None
+    return combined
+
+
+def init_worker(queue, dump_failures):
+    """
+    Worker process initializer, connects the worker to the error file
+    writer of the parent process
+
+    :param queue: queue served by the parent ErrorFile writer
+    :param dump_failures: (bool) save full failure tables as .npy files
+    """
+    ut.ErrorFile.connect(queue)
+    ut.ErrorFile.dump_failures = dump_failures
+
+
+def run_job(args):
+    """
+    Runs a single comparison job, error messages are keyed by the job
+    number so the parent writes them in job order
+
+    :param args: (tuple) job number, (suite, output type, file name) job
+    :return: (tuple) job, pass/fail, wall time
+    """
+    ix, job = args
+    ut.ErrorFile.key = ix
+
+    t0 = time.time()
+    try:
+        test_suites.compare(*job)
+        passed = True
+
+    except AssertionError:
+        passed = False
+
+    except Exception:
+        passed = False
+        ut.ErrorFile.write_error(traceback.format_exc())
+
+    return job, passed, time.time() - t0
+
+
+def write_report(results, report, runs=()):
+    """
+    Writes the combined run report
+
+    :param results: list of run_job results, in job order
+    :param report: (str) combined report file name
+    :param runs: list of combine_lgr_runs() LGR run verdicts
+    """
+    line = "{} {}::{}[{}] {:.2f}s\n"
+    with open(report, "w") as f:
+        f.write(ut.ErrorFile.header)
+        for job, passed, elapsed in results:
+            f.write(line.format("PASS" if passed else "FAIL", job[0],
+                                job[1], job[2], elapsed))
+
+        npass = sum([1 for result in results if result[1]])
+        f.write("\n{} passed, {} failed\n".format(npass,
+                                                  len(results) - npass))
+        if runs:
+            f.write("\nLGR runs:\n")
+            for run, passed, elapsed in runs:
+                f.write(line.format("PASS" if passed else "FAIL", run[0],
+                                    run[1], "+".join(run[2]), elapsed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split("\n")[0])
+    parser.add_argument("suites", nargs="*", default=list(SUITES),
+                        help="manifest suites to run, defaults to all suites")
+    parser.add_argument("-n", "--processes", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument("--report", default="parallel_report.txt",
+                        help="combined report file name")
+    parser.add_argument("--dump-failures", action="store_true",
+                        help="save the full table of failing cells of each "
+                             "failed comparison as a .npy file")
+    args = parser.parse_args(argv)
+    unknown = [suite for suite in args.suites if suite not in SUITES]
+    if unknown:
+        parser.error("unknown suites: {}".format(", ".join(unknown)))
+
+    manager = multiprocessing.Manager()
+    ut.ErrorFile.serve(manager.Queue())
+    jobs, runs = collect_jobs(args.suites)
+
+    # error files are created by the parent, workers only append to them
+    for suite in set([job[0] for job in jobs]):
+        test_suites.get_error_file(manifest.get_suite(suite))
+
+    pool = multiprocessing.Pool(processes=max(1, args.processes),
+                                initializer=init_worker,
+                                initargs=(ut.ErrorFile.queue,
+                                          args.dump_failures))
+    try:
+        results = pool.map(run_job, list(enumerate(jobs)), chunksize=1)
+
+    finally:
+        pool.close()
+        pool.join()
+
+    runs = combine_lgr_runs(jobs, runs, results)
+    ut.ErrorFile.close()
+    manager.shutdown()
+    write_report(results, args.report, runs)
+
+    nfail = sum([1 for result in results if not result[1]])
+    print("{} jobs, {} failed, report: {}".format(len(results), nfail,
+                                                  args.report))
+    return 1 if nfail else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,7 @@
-C:\Python27\ArcGISx6410.3\Scripts\py.test test_mf2005_files.py
-C:\Python27\ArcGISx6410.3\Scripts\py.test test_nwt_files.py
-C:\Python27\ArcGISx6410.3\Scripts\py.test test_rip_files.py
-C:\Python27\ArcGISx6410.3\Scripts\py.test test_swi_files.py
-C:\Python27\ArcGISx6410.3\Scripts\py.test test_swr_files.py
+C:\Python27\ArcGISx6410.3\Scripts\py.test test_suites.py --suite mf2005 --suite nwt --suite rip --suite swi --suite swr
 pause
-C:\Python27\ArcGISx6410.3\Scripts\py.test test_mfowhm_example.py
-C:\Python27\ArcGISx6410.3\Scripts\py.test test_fmp_files.py
+C:\Python27\ArcGISx6410.3\Scripts\py.test test_suites.py --suite mfowhm --suite fmp
 pause
-C:\Python27\ArcGISx6410.3\Scripts\py.test test_lgr_pcg_files.py
-C:\Python27\ArcGISx6410.3\Scripts\py.test test_lgr_nwt_files.py
+C:\Python27\ArcGISx6410.3\Scripts\py.test test_suites.py --suite lgr_pcg --suite lgr_nwt
 pause
 pause
\ No newline at end of file
@@ -0,0 +1,250 @@
+"""
+Round trip tests of the output readers on small synthetic files written
+with the benchmark.py generators, checked against the flopy readers.
+These tests do not need the example problem workspaces.
+"""
+import os
+
+import flopy as fp
+import numpy as np
+import pytest
+
+import benchmark
+import utilities as ut
+
+
+SWR_TYPES = sorted(ut.SwrBinaryFile.items)
+
+
+def test_head_matches_flopy(tmp_path):
+    filename = str(tmp_path / "model.hds")
+    benchmark.write_head_file(filename, (3, 2, 4, 5))
+
+    hds = ut.HeadFile(str(tmp_path), "model.hds")
+    assert hds.success
+    assert hds.head.dtype == np.float32
+
+    flo = fp.utils.HeadFile(filename)
+    assert hds.head.kstpkper == [(kstp + 1, kper + 1) for kstp, kper
+                                 in flo.get_kstpkper()]
+    np.testing.assert_array_equal(hds.head.totim, flo.get_times())
+    np.testing.assert_array_equal(np.asarray(hds.head), flo.get_alldata())
+    np.testing.assert_array_equal(hds.head[1, 1],
+                                  flo.get_data(kstpkper=(0, 1))[1])
+
+
+def test_head_active_cells(tmp_path):
+    ntime, nlay, nrow, ncol = shape = (3, 2, 4, 5)
+    filename = str(tmp_path / "model.hds")
+    benchmark.write_head_file(filename, shape)
+
+    # cell 0 is dry in the first time step only, cell 1 is always no flow
+    record = np.dtype([("header", "V44"), ("head", "<f4", (nrow, ncol))])
+    heads = np.memmap(filename, dtype=record, mode="r+")["head"]
+    heads[0, 0, 0] = 1e30
+    heads[::nlay, 0, 1] = -999.99
+    heads.flush()
+    del heads
+
+    hds = ut.HeadFile(str(tmp_path), "model.hds", active=True)
+    assert hds.success
+    np.testing.assert_array_equal(hds.active,
+                                  np.delete(np.arange(nlay * nrow * ncol), 1))
+    assert hds.head.shape == (ntime, nlay * nrow * ncol - 1)
+
+
+def test_head_active_cells_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(ut.OutputCache, "ws", str(tmp_path / "cache"))
+    benchmark.write_head_file(str(tmp_path / "model.hds"), (2, 1, 3, 3))
+
+    saved = []
+    save = ut.OutputCache.save
+
+    def record_save(filename, kind, *args, **kwargs):
+        saved.append(kind)
+        save(filename, kind, *args, **kwargs)
+
+    monkeypatch.setattr(ut.OutputCache, "save", staticmethod(record_save))
+
+    first = ut.HeadFile(str(tmp_path), "model.hds", cache=True, active=True)
+    second = ut.HeadFile(str(tmp_path), "model.hds", cache=True, active=True)
+    assert saved == ["HeadFile", "HeadFile.active"]
+    np.testing.assert_array_equal(first.active, np.arange(9))
+    np.testing.assert_array_equal(second.active, first.active)
+
+
+def test_budget_matches_flopy(tmp_path):
+    filename = str(tmp_path / "model.cbc")
+    benchmark.write_budget_file(filename, (3, 2, 3, 4), nwell=5)
+
+    index = ut.CellBudgetIndex(filename)
+    flo = fp.utils.CellBudgetFile(filename)
+    assert index.unique_record_names() == \
+        [name.decode() for name in flo.get_unique_record_names()]
+    for text in ("STORAGE", "WELLS"):
+        data = index.get_data(text)
+        valid = flo.get_data(text=text, full3D=True)
+        assert len(data) == len(valid) == 3
+        for arr, valid_arr in zip(data, valid):
+            np.testing.assert_array_equal(arr, valid_arr)
+
+    dense = ut.CellByCellBudget(str(tmp_path), "model.cbc", sparse=False)
+    sparse = ut.CellByCellBudget(str(tmp_path), "model.cbc")
+    assert isinstance(sparse["WELLS"], ut.SparseBudgetTerm)
+    np.testing.assert_array_equal(sparse["WELLS"].toarray(), dense["WELLS"])
+    np.testing.assert_array_equal(
+        dense["WELLS"], flo.get_data(text="WELLS", full3D=True))
+
+
+def test_budget_items_load_terms(tmp_path):
+    benchmark.write_budget_file(str(tmp_path / "model.cbc"), (2, 2, 3, 4),
+                                nwell=3)
+
+    cbc = ut.CellByCellBudget(str(tmp_path), "model.cbc")
+    assert cbc.success
+    assert cbc.keys() == ["STORAGE", "WELLS"]
+    items = cbc.items()
+    assert [key for key, _ in items] == cbc.keys()
+    assert all(data is not None for data in cbc.values())
+    for key, data in items:
+        assert data is cbc[key]
+
+    cbc.release()
+    assert all(data is not None for _, data in cbc.items())
+
+
+def test_list_select(tmp_path):
+    filename = str(tmp_path / "model.lst")
+    benchmark.write_list_file(filename, ntime=5)
+
+    parser = ut.ListBudgetParser(filename, persist=True)
+    np.testing.assert_array_equal(parser.select(last=2), [3, 4])
+    assert os.path.isfile(filename + ".idx.npz")
+    np.testing.assert_array_equal(parser.select(kper=[1, 3], last=1), [2])
+    for last in (0, -1):
+        with pytest.raises(ValueError):
+            parser.select(last=last)
+
+
+def test_list_matches_flopy(tmp_path):
+    filename = str(tmp_path / "model.lst")
+    benchmark.write_list_file(filename, ntime=4)
+
+    budget = ut.ListBudgetParser(filename).get_budget()
+    inc = fp.utils.MfListBudget(filename).get_budget()[0]
+    names = [name for name in inc.dtype.names
+             if name not in ("totim", "time_step", "stress_period")]
+    assert sorted(budget) == sorted(names)
+    for name in names:
+        np.testing.assert_allclose(budget[name], inc[name], rtol=1e-6)
+
+    lst = ut.ListBudget(str(tmp_path), "model.lst")
+    assert lst.success
+    np.testing.assert_array_equal(lst["TSLEN"], [1., 2., 3., 4.])
+    assert not os.path.exists(filename + ".idx.npz")
+
+    lst = ut.ListBudget(str(tmp_path), "model.lst", last=2)
+    np.testing.assert_array_equal(lst["TSLEN"], [3., 4.])
+    assert os.path.isfile(filename + ".idx.npz")
+
+
+def test_list_unparsed_rates(tmp_path):
+    ut.ErrorFile(error_name=str(tmp_path / "errors.txt"))
+    filename = str(tmp_path / "model.lst")
+    benchmark.write_list_file(filename, ntime=2)
+    with open(filename) as f:
+        lines = f.readlines()
+
+    # overflow the last budget rate of the second time step
+    ix = max(i for i, line in enumerate(lines)
+             if line.strip().startswith("RECHARGE"))
+    lines[ix] = lines[ix][:lines[ix].rindex("=") + 1] + " " * 8 + "*" * 9 + \
+        "\n"
+    with open(filename, "w") as f:
+        f.writelines(lines)
+
+    parser = ut.ListBudgetParser(filename)
+    budget = parser.get_budget()
+    assert parser.unparsed == [(1, 2, "RECHARGE_OUT", "*********")]
+    assert np.isnan(budget["RECHARGE_OUT"][1])
+
+    lst = ut.ListBudget(str(tmp_path), "model.lst")
+    assert lst.fail_list == ["rates"]
+
+    valid_ws = tmp_path / "valid"
+    valid_ws.mkdir()
+    benchmark.write_list_file(str(valid_ws / "model.lst"), ntime=2)
+    valid = ut.ListBudget(str(valid_ws), "model.lst")
+    assert ut.budget_compare(valid, valid)
+    assert not ut.budget_compare(lst, valid)
+
+    ut.ErrorFile.close()
+    with open(str(tmp_path / "errors.txt")) as f:
+        text = f.read()
+
+    assert "budget item: RECHARGE_OUT, value: *********" in text
+    assert "Budget item RECHARGE_OUT: Budget error: nan" in text
+
+
+@pytest.mark.parametrize("swrtype", SWR_TYPES)
+def test_swr_matches_flopy(tmp_path, swrtype):
+    filename = str(tmp_path / "model.swr")
+    benchmark.write_swr_file(filename, ntime=6, nreach=5, swrtype=swrtype)
+
+    swr = ut.SwrBinaryFile(str(tmp_path), "model.swr", swrtype=swrtype)
+    assert swr.success
+    assert swr.precision == "double"
+    assert swr.ntime == 6
+
+    flo = fp.utils.swroutputfile.SwrFile(filename, swrtype=swrtype)
+    np.testing.assert_allclose(swr.totim, flo.get_times())
+    for t in range(swr.ntime):
+        data = flo.get_data(idx=t)
+        values = swr.get_time(t)
+        for ix, name in enumerate(swr.names):
+            np.testing.assert_array_equal(values[:, ix], data[name])
+
+    if swrtype == "flow":
+        np.testing.assert_array_equal(swr.connectivity,
+                                      flo.get_connectivity())
+
+
+@pytest.mark.parametrize("swrtype", SWR_TYPES)
+def test_swr_single_precision(tmp_path, swrtype):
+    benchmark.write_swr_file(str(tmp_path / "double.swr"), ntime=3,
+                             nreach=1, swrtype=swrtype)
+    benchmark.write_swr_file(str(tmp_path / "single.swr"), ntime=3,
+                             nreach=1, swrtype=swrtype, precision="single")
+
+    double = ut.SwrBinaryFile(str(tmp_path), "double.swr", swrtype=swrtype)
+    single = ut.SwrBinaryFile(str(tmp_path), "single.swr", swrtype=swrtype)
+    assert single.success
+    assert single.precision == "single"
+    assert single.dtype == np.float32
+    np.testing.assert_array_equal(single.kswrkstpkper, double.kswrkstpkper)
+    np.testing.assert_array_equal(
+        single.get_values(0, single.ntime),
+        double.get_values(0, double.ntime).astype(np.float32))
+
+
+def test_swr_rejects_truncated_file(tmp_path):
+    filename = str(tmp_path / "model.stg")
+    benchmark.write_swr_file(filename, ntime=3, nreach=4, swrtype="stage")
+    with open(filename, "rb+") as f:
+        f.truncate(os.path.getsize(filename) - 3)
+
+    assert not ut.SwrBinaryFile(str(tmp_path), "model.stg").success
+
+
+def test_swr_compare(tmp_path):
+    ut.ErrorFile(error_name=str(tmp_path / "errors.txt"))
+    for name, perturb in (("sim.rgb", 0.), ("valid.rgb", 1e-4),
+                          ("fail.rgb", 0.5)):
+        benchmark.write_swr_file(str(tmp_path / name), ntime=4, nreach=6,
+                                 perturb=perturb)
+
+    sim, valid, fail = [ut.SwrBinaryFile(str(tmp_path), name)
+                        for name in ("sim.rgb", "valid.rgb", "fail.rgb")]
+    assert ut.swr_compare(sim, valid, cell_tol=0.05, array_tol=0.05,
+                          chunk_size=64)
+    assert not ut.swr_compare(fail, valid, cell_tol=0.05, array_tol=0.05)
@@ -0,0 +1,298 @@
+import traceback
+from multiprocessing.pool import ThreadPool
+
+import pytest
+import utilities as ut
+import manifest
+
+
+error_files = {}
+
+
+def get_error_file(suite):
+    """
+    Method to get the error file of a suite, the error file is created the
+    first time a suite is compared
+
+    :param suite: (dict) manifest suite entry
+    :return: <ErrorFile>
+    """
+    if suite["name"] not in error_files:
+        error_files[suite["name"]] = ut.ErrorFile(
+            error_name=suite["error_file"])
+
+    return error_files[suite["name"]]
+
+
+def load_list_budget(suite, name, owhm2_ws, valid_ws):
+    owhm2 = ut.ListBudget(ws=owhm2_ws, listname=name)
+    valid = ut.ListBudget(ws=valid_ws, listname=name, cache=True)
+    return owhm2, valid
+
+
+def compare_list_budget(suite, owhm2, valid):
+    tolerance = manifest.get_tolerance(suite)
+    incremental_tolerance = tolerance['incremental_tolerance']
+    budget_tolerance = tolerance['budget_tolerance']
+
+    if owhm2.success and valid.success:
+        assert ut.budget_compare(sim_budget=owhm2, valid_budget=valid,
+                                 incremental_tolerance=incremental_tolerance,
+                                 budget_tolerance=budget_tolerance)
+
+    else:
+        ut.ErrorFile.write_error("Unkown loading error\n")
+        assert owhm2.success
+        assert valid.success
+
+
+def load_budget_files(suite, name, owhm2_ws, valid_ws):
+    owhm2 = ut.CellByCellBudget(ws=owhm2_ws, budgetname=name)
+    valid = ut.CellByCellBudget(ws=valid_ws, budgetname=name, cache=True)
+    return owhm2, valid
+
+
+def compare_budget_files(suite, owhm2, valid):
+    tolerance = manifest.get_tolerance(suite)
+    incremental_tolerance = tolerance['incremental_tolerance']
+    budget_tolerance = tolerance['budget_tolerance']
+
+    if owhm2.success and valid.success:
+
+        assert ut.budget_compare(sim_budget=owhm2, valid_budget=valid,
+                                 incremental_tolerance=incremental_tolerance,
+                                 budget_tolerance=budget_tolerance)
+    else:
+        assert owhm2.success
+        assert valid.success
+
+
+def load_head_files(suite, name, owhm2_ws, valid_ws):
+    active = suite.get("active_cells", False)
+    valid = ut.HeadFile(ws=valid_ws, headname=name, cache=True,
+                        active=active)
+    if valid.active is not None:
+        # compare the simulated heads on the valid model's active cells
+        active = valid.active
+
+    owhm2 = ut.HeadFile(ws=owhm2_ws, headname=name, active=active)
+    return owhm2, valid
+
+
+def compare_head_files(suite, owhm2, valid):
+    tolerance = manifest.get_tolerance(suite)
+
+    if owhm2.success and valid.success:
+        assert ut.array_compare(sim_array=owhm2.head, valid_array=valid.head,
+                                cell_tol=tolerance['cell_tol'],
+                                array_tol=tolerance['array_tol'],
+                                stream=True)
+
+    else:
+        ut.ErrorFile.write_error("Unkown loading error\n")
+        assert owhm2.success
+        assert valid.success
+
+
+def load_farm_outputs(suite, name, owhm2_ws, valid_ws):
+    owhm2 = ut.FarmOutputs(ws=owhm2_ws, outname=name)
+    owhm2.raw_to_stress_period()
+    valid = ut.FarmOutputs(ws=valid_ws, outname=name, cache=True)
+    valid.raw_to_stress_period()
+    return owhm2, valid
+
+
+def compare_farm_outputs(suite, owhm2, valid):
+    tolerance = manifest.get_tolerance(suite)
+    incremental_tolerance = tolerance['incremental_tolerance']
+    budget_tolerance = tolerance['budget_tolerance']
+
+    # todo: setup the success flag with the FarmOutput reader!
+    if owhm2.success and valid.success:
+        assert ut.farm_outputs_compare(
+            owhm2, valid, incremental_tolerance=incremental_tolerance,
+            budget_tolerance=budget_tolerance)
+
+    else:
+        assert owhm2.success
+        assert valid.success
+
+
+def load_swr_files(suite, name, owhm2_ws, valid_ws):
+    owhm2 = ut.SwrBinaryFile(ws=owhm2_ws, swrname=name)
+    valid = ut.SwrBinaryFile(ws=valid_ws, swrname=name)
+    return owhm2, valid
+
+
+def compare_swr_files(suite, owhm2, valid):
+    tolerance = manifest.get_tolerance(suite)
+
+    if owhm2.success and valid.success:
+        assert ut.swr_compare(sim_swr=owhm2, valid_swr=valid,
+                              cell_tol=tolerance['cell_tol'],
+                              array_tol=tolerance['array_tol'])
+
+    else:
+        ut.ErrorFile.write_error("Unkown loading error\n")
+        assert owhm2.success
+        assert valid.success
+
+
+load_functions = {"list": load_list_budget,
+                  "budget": load_budget_files,
+                  "head": load_head_files,
+                  "fds": load_farm_outputs,
+                  "fbdetails": load_farm_outputs,
+                  "swr": load_swr_files}
+
+compare_functions = {"list": compare_list_budget,
+                     "budget": compare_budget_files,
+                     "head": compare_head_files,
+                     "fds": compare_farm_outputs,
+                     "fbdetails": compare_farm_outputs,
+                     "swr": compare_swr_files}
+
+
+def compare(suite_name, kind, name):
+    """
+    Compares one output file of a manifest suite, failures are reported to
+    the suite error file and raise an AssertionError
+
+    :param suite_name: (str) manifest suite name
+    :param kind: (str) output type
+    :param name: (str) output file name, or a tuple of the grid file
+        names of an LGR run
+    """
+    suite = manifest.get_suite(suite_name)
+    owhm2_ws, valid_ws = manifest.get_workspaces(suite, kind)
+    if isinstance(name, tuple):
+        return compare_lgr_run(suite, kind, name, owhm2_ws, valid_ws)
+
+    compare_file(suite, kind, name, owhm2_ws, valid_ws)
+
+
+def compare_file(suite, kind, name, owhm2_ws, valid_ws):
+    """
+    Loads and compares one output file
+
+    :param suite: (dict) manifest suite entry
+    :param kind: (str) output type
+    :param name: (str) output file name
+    :param owhm2_ws: (str) simulated output workspace
+    :param valid_ws: (str) valid output workspace
+    """
+    get_error_file(suite).start_model(name)
+    if ut.identical_outputs(owhm2_ws, valid_ws, name):
+        return
+
+    owhm2, valid = load_functions[kind](suite, name, owhm2_ws, valid_ws)
+    compare_functions[kind](suite, owhm2, valid)
+
+
+def compare_lgr_grid(suite, kind, name, owhm2_ws, valid_ws):
+    """
+    Compares one grid output of an LGR run on a worker thread. The error
+    messages of the grid are held and returned, so the grids of a run are
+    written to the error file in order.
+
+    :param suite: (dict) manifest suite entry
+    :param kind: (str) output type
+    :param name: (str) grid output file name
+    :param owhm2_ws: (str) simulated output workspace
+    :param valid_ws: (str) valid output workspace
+    :return: (tuple) pass/fail, list of held error messages
+    """
+    ut.ErrorFile.hold_messages()
+    try:
+        compare_file(suite, kind, name, owhm2_ws, valid_ws)
+        passed = True
+
+    except AssertionError:
+        passed = False
+
+    except Exception:
+        passed = False
+        ut.ErrorFile.write_error(traceback.format_exc())
+
+    return passed, ut.ErrorFile.release_messages()
+
+
+def compare_lgr_run(suite, kind, names, owhm2_ws, valid_ws):
+    """
+    Compares the parent and child grid outputs of an LGR run as one job.
+    The grids are loaded and compared concurrently on a thread pool, one
+    thread per grid. Every grid is compared and the result of each grid
+    is reported to the suite error file.
+
+    :param suite: (dict) manifest suite entry
+    :param kind: (str) output type
+    :param names: (tuple) grid output file names
+    :param owhm2_ws: (str) simulated output workspace
+    :param valid_ws: (str) valid output workspace
+    :return: (dict) grid file name: pass/fail
+    """
+    # the error file is created before the grid threads write to it
+    get_error_file(suite)
+    pool = ThreadPool(len(names))
+    try:
+        results = pool.map(lambda name: compare_lgr_grid(
+            suite, kind, name, owhm2_ws, valid_ws), names)
+
+    finally:
+        pool.close()
+        pool.join()
+
+    for passed, held in results:
+        for error_name, s in held:
+            ut.ErrorFile.put(error_name, s)
+
+    return report_lgr_run(suite, names, [passed for passed, _ in results])
+
+
+def report_lgr_run(suite, names, results):
+    """
+    Reports the grid results of an LGR run to the suite error file, the
+    run fails if any grid failed
+
+    :param suite: (dict) manifest suite entry
+    :param names: (tuple) grid output file names
+    :param results: (list) pass/fail of each grid
+    :return: (dict) grid file name: pass/fail
+    """
+    get_error_file(suite).start_model("LGR run: {}".format(", ".join(names)))
+    for name, passed in zip(names, results):
+        ut.ErrorFile.write_error("    {}: {}\n".format(
+            name, "PASS" if passed else "FAIL"))
+
+    failed = [name for name, passed in zip(names, results) if not passed]
+    assert not failed, "LGR grids failed: {}".format(", ".join(failed))
+    return dict(zip(names, results))
+
+
+def pytest_generate_tests(metafunc):
+    """
+    Parametrizes test_outputs with every output file of the manifest
+    suites, or of the suites selected with --suite
+    """
+    if "kind" not in metafunc.fixturenames:
+        return
+
+    params = []
+    for suite_name, kind, name in manifest.discover(
+            metafunc.config.getoption("suite")):
+        if name is None:
+            params.append(pytest.param(suite_name, kind, name,
+                                       marks=pytest.mark.skip(
+                                           reason="missing valid workspace"),
+                                       id="{}-{}".format(suite_name, kind)))
+        else:
+            grids = "+".join(name) if isinstance(name, tuple) else name
+            params.append(pytest.param(suite_name, kind, name,
+                                       id="{}-{}-{}".format(suite_name, kind,
+                                                            grids)))
+
+    metafunc.parametrize("suite_name,kind,name", params)
+
+
+def test_outputs(suite_name, kind, name):
+    compare(suite_name, kind, name)
@@ -0,0 +1,129 @@
+"""
+Tests of the error file, output cache and LGR job utilities on files
+written to a temporary directory.
+"""
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import manifest
+import run_parallel
+import test_suites
+import utilities as ut
+
+
+def test_error_file_threads(tmp_path):
+    names = [str(tmp_path / "errors{}.txt".format(i)) for i in range(2)]
+    barrier = threading.Barrier(len(names))
+
+    def compare(name):
+        error_file = ut.ErrorFile(error_name=name)
+        barrier.wait()
+        error_file.start_model(name)
+        for i in range(50):
+            ut.ErrorFile.write_error("{} {}\n".format(name, i))
+            barrier.wait()
+
+    threads = [threading.Thread(target=compare, args=(name,))
+               for name in names]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    ut.ErrorFile.close()
+    for name in names:
+        with open(name) as f:
+            lines = f.read().split("@@@@@:  ")[-1].splitlines()
+
+        assert lines == [name] + ["{} {}".format(name, i) for i in range(50)]
+
+
+def test_error_file_close_registered_once(monkeypatch):
+    registered = []
+    monkeypatch.setattr(ut.atexit, "register", registered.append)
+    monkeypatch.setattr(ut.ErrorFile, "registered", False)
+    for _ in range(3):
+        ut.ErrorFile.serve(ut.Queue.Queue())
+        ut.ErrorFile.close()
+
+    assert registered == [ut.ErrorFile.close]
+
+
+def test_cache_fingerprint_middle_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(ut.OutputCache, "sample_size", 1024)
+    filename = str(tmp_path / "model.hds")
+    data = np.arange(64 * 1024, dtype=np.uint8)
+    data.tofile(filename)
+    stat = os.stat(filename)
+    fingerprint = ut.OutputCache.fingerprint(filename, "HeadFile")
+    assert ut.OutputCache.fingerprint(filename, "HeadFile") == fingerprint
+
+    # a rerun that changes a few values in the middle of the file, with
+    # the size and modification time preserved
+    data[data.size // 2] += 1
+    with open(filename, "r+b") as f:
+        f.write(data.tobytes())
+
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.stat(filename).st_size == stat.st_size
+    assert ut.OutputCache.fingerprint(filename, "HeadFile") != fingerprint
+
+
+def test_lgr_grids_compared_concurrently(tmp_path, monkeypatch):
+    names = ("parent.hds", "child1.hds", "child2.hds")
+    suite = {"name": "lgr_test", "error_file": str(tmp_path / "lgr.txt")}
+    # every grid waits for the others, a serial run breaks the barrier
+    barrier = threading.Barrier(len(names), timeout=10)
+
+    def load(suite, name, owhm2_ws, valid_ws):
+        barrier.wait()
+        return name, name
+
+    def compare(suite, owhm2, valid):
+        ut.ErrorFile.write_error("compared {}\n".format(owhm2))
+        assert owhm2 != "child1.hds"
+
+    monkeypatch.setitem(test_suites.load_functions, "head", load)
+    monkeypatch.setitem(test_suites.compare_functions, "head", compare)
+    monkeypatch.setattr(ut, "identical_outputs", lambda *args: False)
+    monkeypatch.setattr(test_suites, "error_files", {})
+
+    with pytest.raises(AssertionError, match="child1.hds"):
+        test_suites.compare_lgr_run(suite, "head", names, str(tmp_path),
+                                    str(tmp_path))
+
+    ut.ErrorFile.close()
+    with open(suite["error_file"]) as f:
+        text = f.read()
+
+    # held grid messages are written in grid order, then the run summary
+    sections = ["@@@@@:  {}\ncompared {}\n".format(name, name)
+                for name in names]
+    assert "".join(sections) in text
+    assert text.endswith("@@@@@:  LGR run: parent.hds, child1.hds, "
+                         "child2.hds\n    parent.hds: PASS\n"
+                         "    child1.hds: FAIL\n    child2.hds: PASS\n")
+
+
+def test_lgr_grids_are_parallel_jobs(monkeypatch):
+    runs = [("lgr_nwt", "head", ("parent.hds", "child1.hds")),
+            ("mf2005", "list", "m.lst")]
+    monkeypatch.setattr(manifest, "discover", lambda suites: iter(runs))
+
+    jobs, lgr_runs = run_parallel.collect_jobs()
+    assert jobs == [("lgr_nwt", "head", "parent.hds"),
+                    ("lgr_nwt", "head", "child1.hds"),
+                    ("mf2005", "list", "m.lst")]
+    assert lgr_runs == runs[:1]
+
+
+def test_lgr_runs_split_by_run_name():
+    names = ["a_parent.hds", "a_child1.hds", "b_parent.hds",
+             "b_child1.hds", "other.hds"]
+    assert manifest.group_lgr_runs(names) == [
+        ("a_parent.hds", "a_child1.hds"), ("b_parent.hds", "b_child1.hds"),
+        ("other.hds",)]
@@ -1,6 +1,25 @@
 import numpy as np
 import flopy as fp
+import atexit
+import functools
+import hashlib
+import itertools
+import json
+import mmap
 import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
 
 
 class CommonExtentions(object):
@@ -8,27 +27,546 @@ class CommonExtentions(object):
     head_file = [".hed", ".head", ".hds", ".ufh"]
     budget_file = [".cbc", ".bud"]
     out_file = [".out"]
+    swr_file = [".stg", ".rgb", ".flow", ".flw", ".qaq", ".str"]
+
+
+class WorkspaceIndex(object):
+    """
+    Index of the output files of a workspace. The workspace is listed in a
+    single scandir pass and each file is classified from its extension and
+    a fixed size peek at its first bytes, so large outputs are never read
+    to find their type. Indexes are kept for the session and rebuilt when
+    the modification time of the workspace changes.
+
+    File classes are:
+        list: MODFLOW listing file
+        head: binary head file
+        budget: binary cell by cell budget file
+        fmp: farm process text output, with a PER column header
+        swr: binary SWR process output
+        formatted_head: formatted head file
+        binary, text: files of unknown type
+    """
+    peek_size = 256
+    __indexes = {}
+    __lock = threading.Lock()
+    __formatted_head = re.compile(br"^\s*\d+\s+\d+\s+\S+\s+\S+\s+"
+                                  br"[A-Za-z][^\n]*?\s+\d+\s+\d+\s+-?\d+")
+
+    @staticmethod
+    def get(ws, refresh=False):
+        """
+        Method to get the index of a workspace
+
+        :param ws: (str) workspace
+        :param refresh: (bool) rebuild the index even if it is current
+        :return: (dict) file name: file class, in directory order
+        """
+        ws = os.path.abspath(ws)
+        mtime = os.stat(ws).st_mtime
+        with WorkspaceIndex.__lock:
+            entry = WorkspaceIndex.__indexes.get(ws)
+
+        if entry is not None and entry[0] == mtime and not refresh:
+            return entry[1]
+
+        index = WorkspaceIndex.__scan(ws)
+        with WorkspaceIndex.__lock:
+            WorkspaceIndex.__indexes[ws] = (mtime, index)
+
+        return index
+
+    @staticmethod
+    def __scan(ws):
+        """
+        Method to list and classify the files of a workspace in one pass
+
+        :param ws: (str) absolute workspace
+        :return: (dict) file name: file class
+        """
+        names = []
+        if hasattr(os, 'scandir'):
+            it = os.scandir(ws)
+            try:
+                for entry in it:
+                    if entry.is_file():
+                        names.append((entry.name, entry.path))
+            finally:
+                if hasattr(it, 'close'):
+                    it.close()
+
+        else:
+            for name in os.listdir(ws):
+                path = os.path.join(ws, name)
+                if os.path.isfile(path):
+                    names.append((name, path))
+
+        index = OrderedDict()
+        for name, path in names:
+            try:
+                index[name] = WorkspaceIndex.classify(path)
+
+            except (IOError, OSError):
+                # removed or unreadable since it was listed
+                pass
+
+        return index
+
+    @staticmethod
+    def classify(filename):
+        """
+        Method to classify a file from its extension and first bytes
+
+        :param filename: (str) file path
+        :return: (str) file class
+        """
+        with open(filename, 'rb') as f:
+            header = f.read(WorkspaceIndex.peek_size)
+
+        ext = os.path.splitext(filename)[1].lower()
+        if b'\x00' in header:
+            if ext in CommonExtentions.swr_file:
+                return 'swr'
+
+            if _is_record_text(header[8:24]):
+                return 'budget'
+
+            if _head_precision(header) is not None:
+                return 'head'
+
+            return 'binary'
+
+        line = header.split(b'\n', 1)[0]
+        tokens = line.lower().split()
+        if b'per' in tokens or b'kper' in tokens:
+            return 'fmp'
+
+        if ext in CommonExtentions.list_file or b'MODFLOW' in header:
+            return 'list'
+
+        if ext in CommonExtentions.head_file or \
+                WorkspaceIndex.__formatted_head.match(line):
+            return 'formatted_head'
+
+        return 'text'
+
+    @staticmethod
+    def get_class(ws, name):
+        """
+        Method to get the class of a file, from the workspace index if the
+        workspace has been indexed this session
+
+        :param ws: (str) workspace
+        :param name: (str) file name
+        :return: (str) file class
+        """
+        with WorkspaceIndex.__lock:
+            entry = WorkspaceIndex.__indexes.get(os.path.abspath(ws))
+
+        if entry is not None and name in entry[1]:
+            return entry[1][name]
+
+        return WorkspaceIndex.classify(os.path.join(ws, name))
+
+    @staticmethod
+    def clear():
+        """
+        Method to drop the indexes of the session
+        """
+        with WorkspaceIndex.__lock:
+            WorkspaceIndex.__indexes.clear()
+
+
+class Profiler(object):
+    """
+    Opt-in instrumentation of the readers and comparisons. Wall time,
+    bytes read and peak traced memory are recorded for each call of a
+    function decorated with profiled() while Profiler.enabled is True,
+    grouped by the test set in Profiler.test. Disabled profiling costs a
+    single flag check per decorated call.
+
+    Bytes read are taken from /proc/self/io where available and do not
+    include memory mapped reads. Peak memory is the peak of allocations
+    traced by tracemalloc during the call, None where tracemalloc is not
+    available. Bytes read and peak memory are process wide, they include
+    the work of other threads for stages that run concurrently.
+    """
+    enabled = False
+    test = None
+    records = []
+    __local = threading.local()
+
+    @staticmethod
+    def __get_stack():
+        """
+        Method to get the open stage frames of the calling thread
+
+        :return: (list) stage frames
+        """
+        if not hasattr(Profiler.__local, "stack"):
+            Profiler.__local.stack = []
+
+        return Profiler.__local.stack
+
+    @staticmethod
+    def enable():
+        """
+        Method to start recording
+        """
+        Profiler.enabled = True
+        if tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @staticmethod
+    def disable():
+        """
+        Method to stop recording, recorded stages are kept
+        """
+        Profiler.enabled = False
+        if tracemalloc is not None and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @staticmethod
+    def read_bytes():
+        """
+        Method to get the number of bytes read by the process
+
+        :return: (int) bytes read or None if not available
+        """
+        try:
+            with open("/proc/self/io") as f:
+                for line in f:
+                    if line.startswith("rchar:"):
+                        return int(line.split()[1])
+
+        except (IOError, OSError, ValueError):
+            pass
+
+        return None
+
+    @staticmethod
+    def start():
+        """
+        Method to open a stage frame, the peak memory of an enclosing
+        stage is kept before the tracemalloc peak is reset
+        """
+        stack = Profiler.__get_stack()
+        frame = {"t0": time.time(), "read": Profiler.read_bytes(),
+                 "memory": None, "peak": 0}
+        if tracemalloc is not None and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                parent = stack[-1]
+                parent["peak"] = max(parent["peak"], peak)
+
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+
+            frame["memory"] = current
+
+        stack.append(frame)
+
+    @staticmethod
+    def stop(stage):
+        """
+        Method to close the last stage frame and record it
+
+        :param stage: (str) stage name
+        """
+        stack = Profiler.__get_stack()
+        frame = stack.pop()
+        seconds = time.time() - frame["t0"]
+        read = Profiler.read_bytes()
+        if read is not None and frame["read"] is not None:
+            read -= frame["read"]
+
+        peak = None
+        if frame["memory"] is not None and tracemalloc.is_tracing():
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            if stack:
+                parent = stack[-1]
+                parent["peak"] = max(parent["peak"], peak)
+
+            peak -= frame["memory"]
+
+        Profiler.records.append({"test": Profiler.test,
+                                 "stage": stage,
+                                 "seconds": seconds,
+                                 "read_bytes": read,
+                                 "peak_bytes": peak})
+
+    @staticmethod
+    def summary():
+        """
+        Method to total the recorded stages of each test
+
+        :return: (dict) test: list of stage totals, in first call order
+        """
+        tests = {}
+        for record in Profiler.records:
+            stages = tests.setdefault(str(record["test"]), [])
+            for total in stages:
+                if total["stage"] == record["stage"]:
+                    break
+            else:
+                total = {"stage": record["stage"], "calls": 0,
+                         "seconds": 0., "read_bytes": None,
+                         "peak_bytes": None}
+                stages.append(total)
+
+            total["calls"] += 1
+            total["seconds"] += record["seconds"]
+            if record["read_bytes"] is not None:
+                total["read_bytes"] = (total["read_bytes"] or 0) + \
+                    record["read_bytes"]
+
+            if record["peak_bytes"] is not None:
+                total["peak_bytes"] = max(total["peak_bytes"] or 0,
+                                          record["peak_bytes"])
+
+        return tests
+
+    @staticmethod
+    def format():
+        """
+        Method to format the stage totals of each test as a text table
+
+        :return: (str)
+        """
+        line = "    {:<32s} {:>5} {:>10.3f}s {:>14} {:>14}\n"
+        s = ""
+        for test, stages in sorted(Profiler.summary().items()):
+            s += "{}\n".format(test)
+            s += "    {:<32s} {:>5} {:>11} {:>14} {:>14}\n".format(
+                "stage", "calls", "time", "bytes read", "peak memory")
+            for total in stages:
+                s += line.format(total["stage"], total["calls"],
+                                 total["seconds"], str(total["read_bytes"]),
+                                 str(total["peak_bytes"]))
+
+        return s
+
+    @staticmethod
+    def save(filename):
+        """
+        Method to save the recorded stages and the totals of each test
+        as json
+
+        :param filename: (str) json file name
+        """
+        with open(filename, "w") as f:
+            json.dump({"summary": Profiler.summary(),
+                       "records": Profiler.records}, f, indent=2)
+
+
+def profiled(stage):
+    """
+    Decorator that records a function call as a <Profiler> stage when
+    profiling is enabled
+
+    :param stage: (str) stage name
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not Profiler.enabled:
+                return func(*args, **kwargs)
+
+            Profiler.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                Profiler.stop(stage)
+
+        return wrapper
+
+    return decorator
 
 
 class ErrorFile(object):
     """
     Class object to create and store unit testing failure information
-    for MODFLOW-OWHM version 2
+    for MODFLOW-OWHM version 2. Messages are put on a queue that a single
+    writer thread drains into a buffered, open handle per error file.
+    Messages from several threads, or from worker processes connected with
+    ErrorFile.connect(), end up in one ordered file per suite. Messages
+    written with an ErrorFile.key set are held and written in key order
+    when the error files are closed.
+
+    The error file, model name and key set by start_model() are kept per
+    thread, so threads comparing different models write to their own
+    error files. The class attributes are the defaults of threads that
+    have not started a model.
 
     :param error_name: (str) error file name
     """
     name = "errors.txt"
+    dump_failures = False
+    ndump = 0
+    model = None
+    key = None
+    queue = None
+    writer = None
+    connected = False
+    registered = False
+    buffer_size = 65536
+    local = threading.local()
+    __lock = threading.Lock()
 
     header = "MODFLOW-OWHM2 unit testing error file created by python unit testing\n"\
     "utilities. Unit testing code base is located @ https://github.com/jlarsen-usgs/OWHM2-tests.\n"\
     "@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@\n\n"
 
     def __init__(self, error_name='errors.txt'):
+        self.name = error_name
         ErrorFile.name = error_name
+        ErrorFile.local.name = error_name
+
+        # connected worker processes must not truncate the served file
+        if not ErrorFile.connected:
+            ErrorFile.put(error_name, None)
+
+    def start_model(self, s):
+        """
+        Method to route error messages to this error file and append the
+        model name of a unit test to it
+
+        :param s: (str) string that refers to model name
+        """
+        ErrorFile.local.name = self.name
+        ErrorFile.write_model_name(s)
+
+    @staticmethod
+    def get(attr):
+        """
+        Method to get the error file state of the calling thread
+
+        :param attr: (str) name, model or key
+        :return: thread value, or the class default
+        """
+        return getattr(ErrorFile.local, attr, getattr(ErrorFile, attr))
+
+    @staticmethod
+    def put(name, s):
+        """
+        Method to queue a message for an error file, a message of None
+        (re)creates the error file with the header
+
+        :param name: (str) error file name
+        :param s: (str) message
+        """
+        held = getattr(ErrorFile.local, 'held', None)
+        if held is not None and s is not None:
+            held.append((name, s))
+            return
+
+        if ErrorFile.queue is None:
+            ErrorFile.serve(Queue.Queue())
+
+        ErrorFile.queue.put((name, ErrorFile.get('key'), s))
+
+    @staticmethod
+    def hold_messages():
+        """
+        Method to hold the messages of the calling thread instead of
+        writing them, so concurrent comparisons can be written in order
+        with put() after they finish
+        """
+        ErrorFile.local.held = []
+
+    @staticmethod
+    def release_messages():
+        """
+        Method to stop holding the messages of the calling thread
+
+        :return: list of held (error file name, message) tuples
+        """
+        held = getattr(ErrorFile.local, 'held', None) or []
+        ErrorFile.local.held = None
+        return held
+
+    @staticmethod
+    def serve(q):
+        """
+        Method to start the writer thread that drains a queue into the
+        error files. Pass a multiprocessing Manager().Queue() to accept
+        messages from worker processes.
+
+        :param q: queue object
+        """
+        ErrorFile.close()
+        ErrorFile.queue = q
+        ErrorFile.writer = threading.Thread(target=ErrorFile.__write_loop,
+                                            args=(q,))
+        ErrorFile.writer.daemon = True
+        ErrorFile.writer.start()
+        if not ErrorFile.registered:
+            ErrorFile.registered = True
+            atexit.register(ErrorFile.close)
+
+    @staticmethod
+    def connect(q):
+        """
+        Method to send the error messages of a worker process to the
+        queue served by the parent process
+
+        :param q: queue object passed to ErrorFile.serve() by the parent
+        """
+        ErrorFile.queue = q
+        ErrorFile.writer = None
+        ErrorFile.connected = True
+
+    @staticmethod
+    def close():
+        """
+        Method to write the held keyed messages, flush and close all open
+        error files
+        """
+        if ErrorFile.writer is None:
+            return
+
+        ErrorFile.queue.put(None)
+        ErrorFile.writer.join()
+        ErrorFile.writer = None
+        ErrorFile.queue = None
 
-        with open(ErrorFile.name, "w") as f:
-            f.write(ErrorFile.header)
+    @staticmethod
+    def __write_loop(q):
+        """
+        Writer thread loop, drains the queue into buffered error files
+        until a None sentinel is received
+        """
+        handles = {}
+        keyed = {}
+        while True:
+            item = q.get()
+            if item is None:
+                break
+
+            name, key, s = item
+            if s is None:
+                if name in handles:
+                    handles[name].close()
+
+                handles[name] = open(name, 'w', ErrorFile.buffer_size)
+                handles[name].write(ErrorFile.header)
+                keyed[name] = []
+
+            else:
+                if name not in handles:
+                    handles[name] = open(name, 'a', ErrorFile.buffer_size)
+                    keyed[name] = []
+
+                if key is None:
+                    handles[name].write(s)
+                else:
+                    keyed[name].append((key, len(keyed[name]), s))
+
+        for name, f in handles.items():
+            for key, ix, s in sorted(keyed[name]):
+                f.write(s)
 
+            f.close()
 
     @staticmethod
     def write_error(s):
@@ -36,177 +574,1687 @@ class ErrorFile(object):
         Method to append error information to the error file
         :param s: (str) sting describing unit test failure
         """
-        with open(ErrorFile.name, 'a') as f:
-            f.write(s)
+        ErrorFile.put(ErrorFile.get('name'), s)
+
+    @staticmethod
+    def write_failures(report):
+        """
+        Method to append a bounded cell failure report to the error file.
+        If ErrorFile.dump_failures is True the full failure table is
+        also saved as a binary .npy file next to the error file, named
+        after the model and the job key so parallel workers do not
+        overwrite each other's tables.
+
+        :param report: <FailureReport> instance
+        """
+        s = report.format()
+        if ErrorFile.dump_failures:
+            with ErrorFile.__lock:
+                ErrorFile.ndump += 1
+                ndump = ErrorFile.ndump
+
+            parts = [os.path.splitext(ErrorFile.get('name'))[0]]
+            model = ErrorFile.get('model')
+            if model is not None:
+                parts.append(re.sub(r"[^\w.-]+", "_", model))
+
+            key = ErrorFile.get('key')
+            if key is not None:
+                parts.append("job{}".format(key))
+
+            elif ErrorFile.connected:
+                parts.append("pid{}".format(os.getpid()))
+
+            npy = "{}_{:04d}.npy".format("_".join(parts), ndump)
+            report.save(npy)
+            s += "Full failure table: {}\n".format(npy)
+
+        ErrorFile.write_error(s)
+
+    @staticmethod
+    def write_model_name(s):
+        """
+        Method to append model name unit test to the error file
+        :param s: (str) string that refers to model name
+        """
+        ErrorFile.local.model = s
+        ErrorFile.put(ErrorFile.get('name'), "@@@@@:  {}\n".format(s))
+
+
+class FailureReport(object):
+    """
+    Class object to store cell tolerance failures from the comparison
+    utilities as a numpy structured array instead of text. Only the
+    top_n worst cells are formatted for the error file, along with
+    failure counts per stress period and layer. One dimensional series,
+    such as list file budgets, are stored by entry in the neutral index
+    column rather than as stress periods.
+
+    :param label: (str) label that starts each report line
+    :param ndim: (int) number of dimensions of the compared arrays
+    :param names: (tuple) optional names of the index columns, replaces
+        the kper, layer, row and column names in the report lines
+    """
+    dtype = np.dtype([('index', '<i4'),
+                      ('kper', '<i4'),
+                      ('layer', '<i4'),
+                      ('row', '<i4'),
+                      ('col', '<i4'),
+                      ('sim', '<f8'),
+                      ('valid', '<f8'),
+                      ('criterion', '<f8')])
+
+    top_n = 25
+
+    columns = {4: ('kper', 'layer', 'row', 'col'),
+               3: ('layer', 'row', 'col'),
+               2: ('row', 'col'),
+               1: ('index',)}
+
+    formats = {4: "kper: %d, layer: %d, row: %d, column %d, ",
+               3: "layer: %d, row: %d, column %d, ",
+               2: "row: %d, column %d, ",
+               1: "entry number: %d, "}
+
+    def __init__(self, label, ndim, names=None):
+        self.label = label
+        self.ndim = ndim
+        self.names = names
+        self.__chunks = []
+
+    def __len__(self):
+        return sum([chunk.size for chunk in self.__chunks])
+
+    def add(self, index, sim, valid, criterion):
+        """
+        Method to add failing cells to the report
+
+        :param index: (tuple) zero based index arrays, as from np.where
+        :param sim: (np.array) simulated values of the failing cells
+        :param valid: (np.array) valid values of the failing cells
+        :param criterion: (np.array) failure criteria of the failing cells
+        """
+        chunk = np.zeros(len(criterion), dtype=FailureReport.dtype)
+        for name in FailureReport.columns[4] + FailureReport.columns[1]:
+            chunk[name] = -1
+
+        for name, ix in zip(FailureReport.columns[self.ndim], index):
+            chunk[name] = np.asarray(ix) + 1
+
+        chunk['sim'] = sim
+        chunk['valid'] = valid
+        chunk['criterion'] = criterion
+        self.__chunks.append(chunk)
+
+    @property
+    def table(self):
+        """
+        Full failure table as a numpy structured array
+        """
+        if len(self.__chunks) == 0:
+            return np.zeros(0, dtype=FailureReport.dtype)
+
+        if len(self.__chunks) > 1:
+            self.__chunks = [np.concatenate(self.__chunks)]
+
+        return self.__chunks[0]
+
+    def worst(self, top_n=None):
+        """
+        Method to get the worst failing cells sorted by failure criteria
+
+        :param top_n: (int) number of cells, defaults to FailureReport.top_n
+        :return: np.ndarray of FailureReport.dtype
+        """
+        if top_n is None:
+            top_n = FailureReport.top_n
+
+        table = self.table
+        criterion = -np.abs(table['criterion'])
+        if 0 < top_n < table.size:
+            idx = np.argpartition(criterion, top_n - 1)[:top_n]
+
+        else:
+            idx = np.arange(table.size)
+
+        return table[idx[np.argsort(criterion[idx], kind='mergesort')]]
+
+    def counts(self, column):
+        """
+        Method to count failing cells per unique value of a column
+
+        :param column: (str) FailureReport.dtype column name
+        :return: (tuple) np.array of values, np.array of counts
+        """
+        return np.unique(self.table[column], return_counts=True)
+
+    @profiled('FailureReport.format')
+    def format(self, top_n=None):
+        """
+        Method to format the worst failing cells and the aggregate
+        failure counts in a single pass
+
+        :param top_n: (int) number of cells, defaults to FailureReport.top_n
+        :return: (str) report text
+        """
+        worst = self.worst(top_n)
+        columns = FailureReport.columns[self.ndim]
+        fields = columns + ('sim', 'valid', 'criterion')
+        if self.names is None:
+            index = FailureReport.formats[self.ndim]
+        else:
+            index = "".join(["{}: %d, ".format(name) for name in self.names])
+
+        line = "{}: ".format(self.label) + index + \
+               "sim_val: %.2f, valid_val: %.2f, failure criteria : %.3f\n"
+
+        s = "{}: {} cells failed, {} worst cells shown\n".format(self.label,
+                                                               len(self),
+                                                               worst.size)
+        values = itertools.chain.from_iterable(
+            zip(*[worst[name].tolist() for name in fields]))
+        s += (line * worst.size) % tuple(values)
+
+        if self.ndim > 2:
+            for name in columns[:-2]:
+                values, counts = self.counts(name)
+                pairs = itertools.chain.from_iterable(zip(values.tolist(),
+                                                          counts.tolist()))
+                s += "{}: failures per {}: ".format(self.label, name)
+                s += ", ".join(["%d: %d"] * values.size) % tuple(pairs)
+                s += "\n"
+
+        return s
+
+    def save(self, filename):
+        """
+        Method to save the full failure table as a binary .npy file
+
+        :param filename: (str) output file name
+        """
+        np.save(filename, self.table)
+
+
+class OutputCache(object):
+    """
+    Persistent cache of parsed output files. Parsed arrays are stored as
+    .npy files in a cache entry directory keyed by a fingerprint of the
+    output file, the reader, the reader parameters that change the parsed
+    arrays and OutputCache.version, and are loaded back as memory mapped
+    arrays. The cache is bounded by OutputCache.max_size bytes, least
+    recently used entries are evicted first.
+
+    The file fingerprint hashes the absolute path, size, inode,
+    modification and status change times in nanoseconds, the leading and
+    trailing OutputCache.sample_size bytes and OutputCache.sample_blocks
+    blocks spread across the rest of the file. A rewrite or copy changes
+    the inode or the status change time even when the modification time
+    is preserved. A stale entry is only used if a file is changed in
+    place, outside the sampled blocks, without changing its size and
+    with both times restored, use OutputCache.clear() after such edits.
+    """
+    ws = os.environ.get("OWHM2_CACHE",
+                        os.path.join(
+                            os.path.dirname(os.path.abspath(__file__)),
+                                     ".output_cache"))
+    max_size = 4 * 1024 ** 3
+    sample_size = 1024 * 1024
+    sample_blocks = 64
+    # bump when a reader changes how it parses or stores cached arrays
+    version = 3
+    __digests = {}
+    __lock = threading.Lock()
+
+    @staticmethod
+    def __digest(filename):
+        """
+        Method to hash the identity and sampled content of an output file,
+        see the class docstring. The hash is kept until the file changes
+
+        :param filename: (str) output file path
+        :return: (str) hex digest
+        """
+        stat = os.stat(filename)
+        ident = (os.path.abspath(filename), stat.st_size, stat.st_ino,
+                 getattr(stat, 'st_mtime_ns', stat.st_mtime),
+                 getattr(stat, 'st_ctime_ns', stat.st_ctime))
+        with OutputCache.__lock:
+            digest = OutputCache.__digests.get(ident)
+
+        if digest is not None:
+            return digest
+
+        size = OutputCache.sample_size
+        block = max(size // OutputCache.sample_blocks, 1)
+        sha = hashlib.sha1()
+        sha.update("{}|{}|{}|{}|{}".format(*ident).encode('utf-8'))
+        with open(filename, 'rb') as f:
+            sha.update(f.read(size))
+            if stat.st_size > 2 * size:
+                # blocks evenly spaced between the leading and trailing
+                # samples
+                for offset in np.linspace(size, stat.st_size - size - block,
+                                          OutputCache.sample_blocks):
+                    f.seek(int(offset))
+                    sha.update(f.read(block))
+
+                f.seek(-size, os.SEEK_END)
+                sha.update(f.read(size))
+
+        digest = sha.hexdigest()
+        with OutputCache.__lock:
+            OutputCache.__digests[ident] = digest
+
+        return digest
+
+    @staticmethod
+    def fingerprint(filename, kind, params=None):
+        """
+        Method to create the cache key of an output file
+
+        :param filename: (str) output file path
+        :param kind: (str) reader name, readers are cached separately
+        :param params: (dict) json serializable reader parameters, such as
+            precision or a stress period selection, that change the
+            parsed arrays
+        :return: (str) hex digest
+        """
+        sha = hashlib.sha1()
+        sha.update("{}|{}|{}|{}".format(
+            OutputCache.version, kind, OutputCache.__digest(filename),
+            json.dumps(params, sort_keys=True)).encode('utf-8'))
+        return sha.hexdigest()
+
+    @staticmethod
+    def load(filename, kind, params=None):
+        """
+        Method to load the cached arrays of an output file
+
+        :param filename: (str) output file path
+        :param kind: (str) reader name
+        :param params: (dict) reader parameters, see fingerprint()
+        :return: (tuple) dict of extra information, list of (name,
+            memory mapped np.ndarray) pairs. None if the file is not cached
+        """
+        try:
+            entry = os.path.join(OutputCache.ws,
+                                 OutputCache.fingerprint(filename, kind,
+                                                         params))
+            meta_file = os.path.join(entry, "meta.json")
+            with open(meta_file) as f:
+                meta = json.load(f)
+
+            arrays = [(name, np.load(os.path.join(entry, "a{}.npy".format(ix)),
+                                     mmap_mode='r'))
+                      for ix, name in enumerate(meta['names'])]
+
+            # touch the entry for least recently used eviction
+            os.utime(meta_file, None)
+
+        except (IOError, OSError, TypeError, ValueError, KeyError):
+            return None
+
+        return meta['extra'], arrays
+
+    @staticmethod
+    def save(filename, kind, arrays, extra=None, params=None):
+        """
+        Method to store the parsed arrays of an output file. Arrays are
+        written one at a time, so arrays can be passed as a generator
+        that loads each array on demand. Array-likes that are not numpy
+        arrays are written one time step at a time.
+
+        :param filename: (str) output file path
+        :param kind: (str) reader name
+        :param arrays: iterable of (name, array) pairs, names must be
+            json serializable
+        :param extra: (dict) json serializable extra information
+        :param params: (dict) reader parameters, see fingerprint()
+        """
+        tmp = None
+        try:
+            key = OutputCache.fingerprint(filename, kind, params)
+            entry = os.path.join(OutputCache.ws, key)
+            if os.path.isdir(entry):
+                return
+
+            tmp = "{}.{}.tmp".format(entry, os.getpid())
+            if not os.path.isdir(tmp):
+                os.makedirs(tmp)
+
+            names = []
+            for ix, (name, arr) in enumerate(arrays):
+                npy = os.path.join(tmp, "a{}.npy".format(ix))
+                if isinstance(arr, np.ndarray):
+                    np.save(npy, arr)
+
+                else:
+                    out = np.lib.format.open_memmap(npy, mode='w+',
+                                                    dtype=arr.dtype,
+                                                    shape=arr.shape)
+                    for t in range(arr.shape[0]):
+                        out[t] = arr[t]
+
+                    out.flush()
+                    del out
+
+                names.append(name)
+
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump({"path": os.path.abspath(filename),
+                           "kind": kind,
+                           "params": params,
+                           "names": names,
+                           "extra": extra or {}}, f)
+
+            os.rename(tmp, entry)
+
+        except (IOError, OSError, TypeError, ValueError):
+            # another process saved the entry first or the cache is not
+            # writable, the output file is simply not cached
+            if tmp is not None and os.path.isdir(tmp):
+                shutil.rmtree(tmp, ignore_errors=True)
+
+            return
+
+        OutputCache.evict(keep=key)
+
+    @staticmethod
+    def evict(keep=None):
+        """
+        Method to remove least recently used cache entries until the cache
+        is smaller than OutputCache.max_size
+
+        :param keep: (str) cache key that is never evicted
+        """
+        entries = []
+        total = 0
+        for key in os.listdir(OutputCache.ws):
+            entry = os.path.join(OutputCache.ws, key)
+            meta_file = os.path.join(entry, "meta.json")
+            if key.endswith(".tmp") or not os.path.isfile(meta_file):
+                continue
+
+            size = sum([os.path.getsize(os.path.join(entry, f))
+                        for f in os.listdir(entry)])
+            entries.append((os.path.getmtime(meta_file), key, size))
+            total += size
+
+        for mtime, key, size in sorted(entries):
+            if total <= OutputCache.max_size:
+                break
+
+            if key != keep:
+                shutil.rmtree(os.path.join(OutputCache.ws, key),
+                              ignore_errors=True)
+                total -= size
+
+    @staticmethod
+    def clear():
+        """
+        Method to remove every cache entry
+        """
+        if os.path.isdir(OutputCache.ws):
+            shutil.rmtree(OutputCache.ws, ignore_errors=True)
+
+
+class HeadFile(dict):
+    """
+    Class to grab head file information out of the rigid flopy structure
+    and use it for comparisons
+
+    :param ws: (str)
+    :param headname: (str) head file name
+    :param precision: (str) auto, single or double are only valid params.
+        auto detects precision from the first record header
+    :param cache: (bool) load the heads through the <OutputCache>. The
+        full heads and the active cells found from the heads are cached,
+        active cells are selected after loading
+    :param active: (bool or np.array) compress heads to the active cells
+        of the model as an <ActiveHeadArray>. True finds the active cells
+        from ibound, or as the cells that are not no flow or dry in any
+        time step, so cells that wet or dry during the run are kept. An
+        array of active node numbers, such as the active attribute of the
+        valid HeadFile, is used as is.
+    :param ibound: (np.array) optional (nlay, nrow, ncol) ibound array,
+        cells with an ibound of zero are inactive
+    :param inactive: (list) head values of inactive cells (HNOFLO, HDRY)
+        in addition to HeadFile.inactive_values
+    """
+    inactive_values = (1e30, -1e30, -999.99, -888.)
+
+    @profiled('HeadFile')
+    def __init__(self, ws, headname, precision='auto', cache=False,
+                 active=False, ibound=None, inactive=()):
+        self.__ws = ws
+        self.__name = headname
+        self.__precision = precision
+        self.__cache = cache
+        self.__file = os.path.join(ws, headname)
+        self.__ignore = ('totim', 'time_step', 'stress_period')
+        self.__binary = True
+        self.success = True
+        self.head = np.array([])
+        self.active = None
+        self.fail_list = []
+
+        self.__simple_binary()
+        super(HeadFile, self).__init__()
+
+        if self.success:
+            self.__get_heads()
+
+        if self.success and not self.fail_list and \
+                active is not False and active is not None:
+            self.__get_active(active, ibound, inactive)
+
+    def __get_heads(self):
+        # key the cache on the requested precision, before auto detection
+        self.__params = {'precision': self.__precision}
+        if self.__cache:
+            cached = OutputCache.load(self.__file, 'HeadFile', self.__params)
+            if cached is not None:
+                self.head = cached[1][0][1]
+                return
+
+        if self.__binary:
+
+            self.__get_binary_heads()
+        else:
+            # try reading it as a formatted head file
+            self.__get_formatted_heads()
+
+        if self.__cache and not self.fail_list and self.head.size:
+            OutputCache.save(self.__file, 'HeadFile',
+                             [('head', self.head)], params=self.__params)
+
+    def __get_active(self, active, ibound, inactive):
+        """
+        Compresses the heads to the active cells of the model
+
+        :param active: (bool or np.array) see class parameters
+        :param ibound: (np.array) optional ibound array
+        :param inactive: (list) additional inactive head values
+        """
+        try:
+            if len(self.head.shape) != 4 or not len(self.head):
+                raise ValueError("Active cells need 4D heads")
+
+            ncell = int(np.prod(self.head.shape[1:]))
+            if active is not True:
+                index = np.unique(np.asarray(active, dtype=np.int64))
+
+            elif ibound is not None:
+                ibound = np.asarray(ibound).ravel()
+                if ibound.size != ncell:
+                    raise ValueError("ibound does not match the grid")
+
+                index = np.flatnonzero(ibound != 0)
+
+            else:
+                index = self.__find_active(inactive)
+
+            if index.size and (index.max() >= ncell or index.min() < 0):
+                raise ValueError("Active cells do not match the grid")
+
+            self.active = index
+            self.head = ActiveHeadArray(self.head, index)
+
+        except:
+            self.success = False
+            self.fail_list.append('active')
+
+    def __find_active(self, inactive):
+        """
+        Finds the cells that are not no flow or dry in any time step. The
+        heads are scanned one time step at a time and the scan stops once
+        every cell is active. The active cells are cached with the heads.
+
+        :param inactive: (list) additional inactive head values
+        :return: np.array of zero based active node numbers
+        """
+        values = HeadFile.inactive_values + tuple(inactive)
+        params = dict(self.__params, inactive=[float(v) for v in values])
+        if self.__cache:
+            cached = OutputCache.load(self.__file, 'HeadFile.active', params)
+            if cached is not None:
+                return np.array(cached[1][0][1])
+
+        mask = np.ones(int(np.prod(self.head.shape[1:])), dtype=bool)
+        for t in range(len(self.head)):
+            step = np.asarray(self.head[t]).ravel()
+            step_mask = np.abs(step) >= 1e30
+            for value in values:
+                step_mask |= np.isclose(step, value, rtol=1e-6, atol=0.)
+
+            mask &= step_mask
+            if not mask.any():
+                break
+
+        index = np.flatnonzero(~mask)
+        if self.__cache:
+            OutputCache.save(self.__file, 'HeadFile.active',
+                             [('active', index)], params=params)
+
+        return index
+
+    def __simple_binary(self):
+        """
+        Extremely simple binary file checker! Works for head files, but
+        not comprehensive by any nature! Only the first
+        WorkspaceIndex.peek_size bytes of the file are read.
+        :return: bool
+        """
+        try:
+            kind = WorkspaceIndex.get_class(self.__ws, self.__name)
+            if kind in ('head', 'budget', 'binary'):
+                return
+
+            self.__binary = False
+
+        except:
+            self.success = False
+
+    def __get_binary_heads(self):
+        if not os.path.isfile(self.__file):
+            self.success = False
+            self.fail_list.append("no_file")
+            return
+
+        if self.__precision == 'auto':
+            self.__precision = get_head_precision(self.__file) or 'single'
+
+        try:
+            self.head = BinaryHeadArray(self.__file,
+                                        precision=self.__precision)
+
+        except:
+            self.success = False
+            self.fail_list.append('head')
+
+    def __get_formatted_heads(self):
+        try:
+            if self.__precision == 'auto':
+                self.__precision = 'single'
+
+            head = fp.utils.FormattedHeadFile(self.__file,
+                                              precision=self.__precision)
+        except:
+            return
+
+        try:
+            self.head = head.get_alldata()
+            self.success = True
+            self.fail_list = []
+        except:
+            self.fail_list = ['head']
+            return
+
+
+class ActiveHeadArray(object):
+    """
+    Array-like view of a head array compressed to the active cells of a
+    model. Each time step is gathered into a 1D vector of active node
+    heads, one layer record at a time, so heads of inactive cells are
+    never compared.
+
+    :param head: (np.ndarray, BinaryHeadArray) (ntime, nlay, nrow, ncol)
+        heads
+    :param index: (np.array) sorted zero based node numbers of the active
+        cells
+    """
+    ndim = 2
+
+    def __init__(self, head, index):
+        ntime, nlay, nrow, ncol = head.shape
+        self.head = head
+        self.index = np.asarray(index, dtype=np.int64)
+        self.grid_shape = (nlay, nrow, ncol)
+        self.shape = (ntime, self.index.size)
+
+        ncell = nrow * ncol
+        self.__bounds = np.searchsorted(self.index,
+                                        np.arange(nlay + 1) * ncell)
+        self.__local = self.index % ncell
+
+    @property
+    def size(self):
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def dtype(self):
+        return self.head.dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __iter__(self):
+        for t in range(self.shape[0]):
+            yield self.get_time(t)
+
+    def __array__(self, dtype=None, copy=None):
+        arr = np.empty(self.shape, dtype=self.dtype)
+        for t in range(self.shape[0]):
+            self.get_time(t, out=arr[t])
+
+        if dtype is not None:
+            arr = arr.astype(dtype)
+
+        return arr
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            return self.get_time(item)
+
+        return np.asarray(self)[item]
+
+    def get_time(self, t, out=None):
+        """
+        Method to gather the active cell heads of a time step
+
+        :param t: (int) zero based time step number
+        :param out: (np.ndarray) optional output vector
+        :return: np.ndarray of shape (nactive,)
+        """
+        if out is None:
+            out = np.empty(self.shape[1], dtype=self.dtype)
+
+        for k in range(self.grid_shape[0]):
+            start, stop = self.__bounds[k], self.__bounds[k + 1]
+            if stop > start:
+                layer = np.asarray(self.head[t, k]).ravel()
+                out[start:stop] = layer[self.__local[start:stop]]
+
+        return out
+
+    def nodes(self, ix):
+        """
+        Method to get the grid index of active cells
+
+        :param ix: (np.array) positions in the active cell vector
+        :return: (tuple) zero based layer, row and column arrays
+        """
+        return np.unravel_index(self.index[ix], self.grid_shape)
+
+
+class BinaryHeadArray(object):
+    """
+    Lazy array-like reader for MODFLOW binary head files. Record headers
+    are parsed once on construction and each kstp/kper/layer record is
+    exposed as an np.memmap view, so head data is only paged in from disk
+    when it is indexed. Indexing with a time step returns an
+    (nlay, nrow, ncol) array, indexing with a time step and a layer returns
+    the memmap view for that record.
+
+    :param filename: (str) binary head file path
+    :param precision: (str) single or double are only valid params
+    """
+    def __init__(self, filename, precision='single'):
+        if precision == 'double':
+            self.__realtype = np.dtype('<f8')
+        else:
+            self.__realtype = np.dtype('<f4')
+
+        self.__header_dtype = np.dtype([('kstp', '<i4'),
+                                        ('kper', '<i4'),
+                                        ('pertim', self.__realtype),
+                                        ('totim', self.__realtype),
+                                        ('text', 'S16'),
+                                        ('ncol', '<i4'),
+                                        ('nrow', '<i4'),
+                                        ('ilay', '<i4')])
+        self.__file = filename
+        self.__mm = None
+        self.__records = {}
+        self.kstpkper = []
+        self.totim = []
+        self.text = ""
+        self.nlay = 0
+        self.nrow = 0
+        self.ncol = 0
+
+        self.__scan()
+
+    def __scan(self):
+        """
+        Walks the record headers of the binary file and builds an
+        offset index of (kstp, kper) -> {layer: byte offset}
+        """
+        filesize = os.path.getsize(self.__file)
+        if filesize < self.__header_dtype.itemsize:
+            raise ValueError("File too small to be a binary head file")
+
+        self.__mm = np.memmap(self.__file, dtype=np.uint8, mode='r')
+        hsize = self.__header_dtype.itemsize
+        pos = 0
+        while pos < filesize:
+            if pos + hsize > filesize:
+                raise ValueError("Truncated record header")
+
+            header = np.frombuffer(self.__mm, dtype=self.__header_dtype,
+                                   count=1, offset=pos)[0]
+            ncol = int(header['ncol'])
+            nrow = int(header['nrow'])
+            ilay = int(header['ilay'])
+            text = header['text'].decode('ascii').strip().upper()
+
+            if ncol < 1 or nrow < 1 or ilay < 1:
+                raise ValueError("Invalid record header")
+
+            nbytes = ncol * nrow * self.__realtype.itemsize
+            if pos + hsize + nbytes > filesize:
+                raise ValueError("Truncated record")
+
+            if not self.text:
+                self.text = text
+                self.nrow = nrow
+                self.ncol = ncol
+
+            elif (nrow, ncol) != (self.nrow, self.ncol):
+                raise ValueError("Inconsistent record dimensions")
+
+            if text == self.text:
+                key = (int(header['kstp']), int(header['kper']))
+                if key not in self.__records:
+                    self.__records[key] = {}
+                    self.kstpkper.append(key)
+                    self.totim.append(float(header['totim']))
+
+                self.__records[key][ilay] = pos + hsize
+                self.nlay = max(self.nlay, ilay)
+
+            pos += hsize + nbytes
+
+    @property
+    def shape(self):
+        return len(self.kstpkper), self.nlay, self.nrow, self.ncol
+
+    @property
+    def ndim(self):
+        return 4
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def dtype(self):
+        return self.__realtype
+
+    def __len__(self):
+        return len(self.kstpkper)
+
+    def __iter__(self):
+        for t in range(len(self.kstpkper)):
+            yield self.get_time(t)
+
+    def __array__(self, dtype=None, copy=None):
+        arr = np.zeros(self.shape, dtype=self.__realtype)
+        for t in range(len(self.kstpkper)):
+            arr[t] = self.get_time(t)
+
+        if dtype is not None:
+            arr = arr.astype(dtype)
+
+        return arr
+
+    def __getitem__(self, item):
+        if not isinstance(item, tuple):
+            item = (item,)
+
+        tix, rest = item[0], item[1:]
+        if isinstance(tix, (int, np.integer)):
+            if rest and isinstance(rest[0], (int, np.integer)):
+                return self.get_layer(tix, rest[0])[rest[1:]]
+
+            return self.get_time(tix)[rest]
+
+        times = np.arange(len(self.kstpkper))[tix]
+        arr = np.zeros((len(times),) + self.shape[1:],
+                       dtype=self.__realtype)
+        for ix, t in enumerate(times):
+            arr[ix] = self.get_time(t)
+
+        return arr[(slice(None),) + rest]
+
+    def get_layer(self, t, k):
+        """
+        Method to get a single record as a memmap view
+
+        :param t: (int) zero based time step index
+        :param k: (int) zero based layer index
+        :return: np.memmap of shape (nrow, ncol)
+        """
+        key = self.kstpkper[t]
+        if k < 0:
+            k += self.nlay
+
+        if k < 0 or k >= self.nlay:
+            raise IndexError("Layer index out of range")
+
+        ilay = k + 1
+        if ilay not in self.__records[key]:
+            return np.zeros((self.nrow, self.ncol), dtype=self.__realtype)
+
+        offset = self.__records[key][ilay]
+        nbytes = self.nrow * self.ncol * self.__realtype.itemsize
+        return self.__mm[offset:offset + nbytes].view(
+            self.__realtype).reshape((self.nrow, self.ncol))
+
+    def get_time(self, t):
+        """
+        Method to get all layers for a single time step
+
+        :param t: (int) zero based time step index
+        :return: np.ndarray of shape (nlay, nrow, ncol)
+        """
+        arr = np.zeros(self.shape[1:], dtype=self.__realtype)
+        for k in range(self.nlay):
+            arr[k] = self.get_layer(t, k)
+
+        return arr
+
+
+class CellByCellBudget(dict):
+    """
+    Class to grab cell budget information out of a <CellBudgetIndex> and
+    use it for budget comparisons. Sets budget items to an over-ridden
+    dictionary object. Budget terms are read from the file the first
+    time they are accessed, including through get(), items() and
+    values(), and can be dropped again with release().
+
+    :param ws: (str) output directory workspace
+    :param budgetname: (str) budget file name
+    :param precision: (str) auto, single or double are only valid params.
+        auto detects precision from the first record header
+    :param sparse: (bool) store list style budget terms (imeth 2 and 5)
+        as <SparseBudgetTerm> objects instead of full 3D arrays
+    :param cache: (bool) load the budget terms through the <OutputCache>,
+        each term is cached the first time it is read from the file
+    """
+
+    adjust = {"MNW2_IN": "MNW_IN",
+              "MNW2_OUT": "MNW_OUT"}
+
+    @profiled('CellByCellBudget')
+    def __init__(self, ws, budgetname, precision='auto', sparse=True,
+                 cache=False):
+        self.__ws = ws
+        self.__name = budgetname
+        self.__precision = precision
+        # cache keys use the requested precision, before auto detection
+        self.__params_precision = precision
+        self.__sparse = sparse
+        self.__cache = cache
+        self.__file = os.path.join(ws, budgetname)
+        self.__ignore = ('totim', 'time_step', 'stress_period')
+        self.__bud = None
+        self.__records = {}
+        self.success = True
+        self.fail_list = []
+
+        super(CellByCellBudget, self).__init__()
+        self.__get_budget()
+
+    def __get_budget(self):
+        if self.__cache:
+            cached = OutputCache.load(self.__file, 'CellByCellBudget',
+                                      self.__params())
+            if cached is not None:
+                self.__precision = cached[0]['precision']
+                self.__set_records(cached[0]['records'])
+                return
+
+        try:
+            self.__get_index()
+            records = self.__bud.unique_record_names()
+
+        except:
+            self.success = False
+            self.fail_list.append('no_file')
+            return
+
+        self.__set_records(records)
+        if self.__cache:
+            OutputCache.save(self.__file, 'CellByCellBudget', [],
+                             {'precision': self.__precision,
+                              'records': list(self.__records.values())},
+                             params=self.__params())
+
+    def __get_index(self):
+        """
+        Builds the record index of the budget file
+        """
+        if self.__precision == 'auto':
+            self.__precision = get_budget_precision(self.__file) or \
+                'single'
+
+        self.__bud = CellBudgetIndex(self.__file,
+                                     precision=self.__precision)
+
+    def __set_records(self, records):
+        """
+        Sets a placeholder for each budget term of the file
+
+        :param records: (list) budget record names
+        """
+        for name in records:
+            if name.strip().lower() in self.__ignore:
+                pass
+
+            else:
+                key = name.strip().upper()
+                key = CellByCellBudget.adjust.get(key, key)
+                self.__records[key] = name
+                # placeholder until the budget term is accessed
+                super(CellByCellBudget, self).__setitem__(key, None)
+
+    def __params(self, key=None):
+        """
+        Method to get the reader parameters of a cache key
+
+        :param key: (str) budget term name, None for the record index
+        :return: (dict) reader parameters
+        """
+        return {'precision': self.__params_precision,
+                'sparse': self.__sparse, 'term': key}
+
+    @staticmethod
+    def __to_cache(data):
+        """
+        Method to get the cache arrays and extra information of a term
+
+        :param data: np.ndarray or <SparseBudgetTerm>
+        :return: (tuple) list of (part, array) pairs, dict
+        """
+        if isinstance(data, SparseBudgetTerm):
+            return [('key', data.key), ('q', data.q)], \
+                {'shape': list(data.shape)}
+
+        return [('dense', data)], {}
+
+    @staticmethod
+    def __from_cache(extra, arrays):
+        """
+        Method to get a budget term from its cached arrays
+
+        :param extra: (dict) cache information, dense shape of sparse terms
+        :param arrays: list of (part, np.memmap) cache arrays
+        :return: np.memmap or <SparseBudgetTerm>
+        """
+        parts = dict(arrays)
+        if 'dense' in parts:
+            return parts['dense']
+
+        return SparseBudgetTerm.from_key(parts['key'], parts['q'],
+                                         tuple(extra['shape']))
+
+    @profiled('CellByCellBudget.load')
+    def __load(self, key):
+        """
+        Reads a single budget term from the cell by cell budget file, or
+        from the <OutputCache>. Terms are cached when first read.
+
+        :param key: (str) budget term name
+        :return: np.ndarray or <SparseBudgetTerm>
+        """
+        if self.__cache:
+            cached = OutputCache.load(self.__file, 'CellByCellBudget',
+                                      self.__params(key))
+            if cached is not None:
+                return CellByCellBudget.__from_cache(*cached)
+
+        try:
+            if self.__bud is None:
+                self.__get_index()
+
+            data = None
+            if self.__sparse:
+                data = self.__bud.get_sparse(self.__records[key])
+
+            if data is None:
+                data = np.array(self.__bud.get_data(
+                    text=self.__records[key], full3D=True))
+
+        except:
+            self.success = False
+            self.fail_list.append(key)
+            return np.array([])
+
+        if self.__cache:
+            arrays, extra = CellByCellBudget.__to_cache(data)
+            OutputCache.save(self.__file, 'CellByCellBudget', arrays, extra,
+                             params=self.__params(key))
+
+        return data
+
+    def __getitem__(self, key):
+        data = super(CellByCellBudget, self).__getitem__(key)
+        if data is None:
+            data = self.__load(key)
+            super(CellByCellBudget, self).__setitem__(key, data)
+
+        return data
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+
+        return default
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def release(self, key=None):
+        """
+        Method to drop loaded budget terms from memory. Released terms
+        are read from the file again on the next access.
+
+        :param key: (str) budget term name, None releases all terms
+        """
+        if key is None:
+            keys = self.keys()
+
+        else:
+            keys = [key]
+
+        for key in keys:
+            if key in self.__records:
+                super(CellByCellBudget, self).__setitem__(key, None)
+
+    def keys(self):
+        return [key for key in sorted(self)]
+
+
+class CellBudgetIndex(object):
+    """
+    Record offset index for MODFLOW cell by cell budget files. The index
+    (text, kstp, kper, imeth, byte offset, shape) is built in a single
+    sequential scan of the record headers, and budget terms are then read
+    with one bulk read per record in file order.
+
+    :param filename: (str) cell by cell budget file path
+    :param precision: (str) single or double are only valid params
+    """
+    dtype = np.dtype([('text', 'S16'),
+                      ('kstp', '<i4'),
+                      ('kper', '<i4'),
+                      ('imeth', '<i4'),
+                      ('offset', '<i8'),
+                      ('nbytes', '<i8'),
+                      ('nlay', '<i4'),
+                      ('nrow', '<i4'),
+                      ('ncol', '<i4'),
+                      ('naux', '<i4'),
+                      ('nlist', '<i4')])
+
+    def __init__(self, filename, precision='single'):
+        if precision == 'double':
+            self.__realtype = np.dtype('<f8')
+        else:
+            self.__realtype = np.dtype('<f4')
+
+        self.__file = filename
+        self.records = np.zeros(0, dtype=CellBudgetIndex.dtype)
+
+        self.__scan()
+
+    def __scan(self):
+        """
+        Walks the record headers of the budget file and builds the
+        record offset index
+        """
+        nbyte = self.__realtype.itemsize
+        filesize = os.path.getsize(self.__file)
+        records = []
+        with open(self.__file, 'rb') as f:
+            pos = 0
+            while pos < filesize:
+                f.seek(pos)
+                header = f.read(36)
+                if len(header) < 36 or not _is_record_text(header[8:24]):
+                    raise ValueError("Invalid record header")
+
+                kstp, kper = np.frombuffer(header, dtype='<i4', count=2)
+                ncol, nrow, nlay = np.frombuffer(header, dtype='<i4',
+                                                 count=3, offset=24)
+                text = header[8:24]
+                naux = 0
+                nlist = 0
+                if nlay > 0:
+                    imeth = 1
+                    offset = pos + 36
+                    nbytes = ncol * nrow * nlay * nbyte
+
+                else:
+                    nlay = -nlay
+                    imeth = int(np.frombuffer(f.read(4), dtype='<i4')[0])
+                    offset = pos + 40 + 3 * nbyte
+
+                    if imeth in (0, 1):
+                        nbytes = ncol * nrow * nlay * nbyte
+
+                    elif imeth == 2:
+                        f.seek(offset)
+                        nlist = int(np.frombuffer(f.read(4), dtype='<i4')[0])
+                        offset += 4
+                        nbytes = nlist * (4 + nbyte)
+
+                    elif imeth == 3:
+                        nbytes = ncol * nrow * (4 + nbyte)
+
+                    elif imeth == 4:
+                        nbytes = ncol * nrow * nbyte
+
+                    elif imeth == 5:
+                        f.seek(offset)
+                        naux = int(np.frombuffer(f.read(4),
+                                                 dtype='<i4')[0]) - 1
+                        offset += 4 + naux * 16
+                        f.seek(offset)
+                        nlist = int(np.frombuffer(f.read(4), dtype='<i4')[0])
+                        offset += 4
+                        nbytes = nlist * (4 + (naux + 1) * nbyte)
+
+                    else:
+                        raise ValueError("Unsupported imeth: {}".format(imeth))
+
+                if offset + nbytes > filesize:
+                    raise ValueError("Truncated record")
+
+                records.append((text, kstp, kper, imeth, offset, nbytes,
+                                nlay, nrow, ncol, naux, nlist))
+                pos = offset + nbytes
+
+        self.records = np.array(records, dtype=CellBudgetIndex.dtype)
+
+    def unique_record_names(self):
+        """
+        Method to get the unique budget term names in file order
+
+        :return: list of str
+        """
+        names = []
+        for text in self.records['text']:
+            name = text.decode('ascii')
+            if name not in names:
+                names.append(name)
+
+        return names
+
+    def __list_dtype(self, naux):
+        """
+        Record dtype for list style (imeth 2 and 5) budget data
+        """
+        return np.dtype([('node', '<i4'),
+                         ('q', self.__realtype)] +
+                        [('aux{}'.format(i), self.__realtype)
+                         for i in range(naux)])
+
+    def __to_3d(self, rec, buf):
+        """
+        Expands the raw bytes of a single record to a full 3D array
+
+        :param rec: CellBudgetIndex.dtype index record
+        :param buf: (bytes) raw record data
+        :return: np.ndarray of shape (nlay, nrow, ncol)
+        """
+        imeth = rec['imeth']
+        shape = (rec['nlay'], rec['nrow'], rec['ncol'])
+        ncell = rec['nrow'] * rec['ncol']
+
+        if imeth in (0, 1):
+            return np.frombuffer(buf, dtype=self.__realtype).reshape(shape)
+
+        out = np.zeros(shape, dtype=self.__realtype)
+        if imeth in (2, 5):
+            data = np.frombuffer(buf, dtype=self.__list_dtype(rec['naux']))
+            np.add.at(out.ravel(), data['node'] - 1, data['q'])
+
+        elif imeth == 3:
+            ilay = np.frombuffer(buf, dtype='<i4', count=ncell)
+            values = np.frombuffer(buf, dtype=self.__realtype,
+                                   count=ncell, offset=ncell * 4)
+            out.reshape((shape[0], ncell))[ilay - 1, np.arange(ncell)] = values
+
+        elif imeth == 4:
+            out[0] = np.frombuffer(buf, dtype=self.__realtype).reshape(
+                shape[1:])
+
+        return out
+
+    def __select(self, text):
+        """
+        Selects the index records of a budget term in file offset order
+
+        :param text: (str) budget term name
+        :return: np.ndarray of CellBudgetIndex.dtype
+        """
+        text = text.strip().encode('ascii')
+        records = self.records[np.char.strip(self.records['text']) == text]
+        return records[np.argsort(records['offset'], kind='mergesort')]
+
+    def get_sparse(self, text):
+        """
+        Method to read a list style (imeth 2 or 5) budget term as a
+        <SparseBudgetTerm> without expanding it to full 3D arrays
+
+        :param text: (str) budget term name
+        :return: <SparseBudgetTerm>, None if the term is not list based
+        """
+        records = self.__select(text)
+        if records.size == 0 or not np.all(np.isin(records['imeth'], (2, 5))):
+            return None
+
+        record = []
+        node = []
+        q = []
+        with open(self.__file, 'rb') as f:
+            for ix, rec in enumerate(records):
+                f.seek(rec['offset'])
+                data = np.frombuffer(f.read(rec['nbytes']),
+                                     dtype=self.__list_dtype(rec['naux']))
+                record.append(np.full(data.size, ix, dtype=np.int64))
+                node.append(data['node'] - 1)
+                q.append(data['q'])
+
+        shape = (records.size, records[0]['nlay'], records[0]['nrow'],
+                 records[0]['ncol'])
+        return SparseBudgetTerm(np.concatenate(record), np.concatenate(node),
+                                np.concatenate(q), shape)
+
+    def get_data(self, text, full3D=True):
+        """
+        Method to read every record of a budget term with one bulk read
+        per record, in file offset order
+
+        :param text: (str) budget term name
+        :param full3D: (bool) only full 3D arrays are supported
+        :return: list of np.ndarray, one per record
+        """
+        records = self.__select(text)
+
+        data = []
+        with open(self.__file, 'rb') as f:
+            for rec in records:
+                f.seek(rec['offset'])
+                data.append(self.__to_3d(rec, f.read(rec['nbytes'])))
+
+        return data
+
+
+class SparseBudgetTerm(object):
+    """
+    Compact coordinate (COO) storage for list style (imeth 2 and 5) cell
+    by cell budget terms. Only the listed cells are stored, as a sorted
+    linear index into the dense (nrecord, nlay, nrow, ncol) shape and a
+    value, instead of a mostly empty full 3D array per record. Duplicate
+    nodes within a record are summed, as in full 3D arrays.
+
+    :param record: (np.array) zero based record number of each entry
+    :param node: (np.array) zero based node number of each entry
+    :param q: (np.array) budget value of each entry
+    :param shape: (tuple) dense shape (nrecord, nlay, nrow, ncol)
+    """
+    ndim = 4
+
+    def __init__(self, record, node, q, shape):
+        self.shape = tuple(int(i) for i in shape)
+        ncell = self.shape[1] * self.shape[2] * self.shape[3]
+        key = np.asarray(record, dtype=np.int64) * ncell + node
+        self.key, inverse = np.unique(key, return_inverse=True)
+        self.q = np.zeros(self.key.size, dtype=np.asarray(q).dtype)
+        np.add.at(self.q, inverse, q)
+
+    @staticmethod
+    def from_key(key, q, shape):
+        """
+        Method to create a sparse budget term from an already sorted and
+        unique linear index, such as a cached term
+
+        :param key: (np.array) sorted unique linear index
+        :param q: (np.array) budget value of each index
+        :param shape: (tuple) dense shape (nrecord, nlay, nrow, ncol)
+        :return: <SparseBudgetTerm>
+        """
+        term = SparseBudgetTerm.__new__(SparseBudgetTerm)
+        term.shape = tuple(int(i) for i in shape)
+        term.key = key
+        term.q = q
+        return term
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def dtype(self):
+        return self.q.dtype
+
+    def __array__(self, dtype=None, copy=None):
+        arr = self.toarray()
+        if dtype is not None:
+            arr = arr.astype(dtype)
+
+        return arr
+
+    def toarray(self):
+        """
+        Method to expand the budget term to a dense array
+
+        :return: np.ndarray of shape (nrecord, nlay, nrow, ncol)
+        """
+        arr = np.zeros(self.shape, dtype=self.q.dtype)
+        arr.ravel()[self.key] = self.q
+        return arr
 
-    @staticmethod
-    def write_model_name(s):
+    def align(self, other):
         """
-        Method to append model name unit test to the error file
-        :param s: (str) string that refers to model name
+        Method to align the entries of two sparse budget terms of the same
+        shape on the union of their cells. Cells missing from one of the
+        terms are filled with zero.
+
+        :param other: <SparseBudgetTerm> instance
+        :return: (tuple) dense index tuple, np.array of self values,
+            np.array of other values
         """
-        with open(ErrorFile.name, 'a') as f:
-            f.write("@@@@@:  {}\n".format(s))
+        key = np.union1d(self.key, other.key)
+        this = np.zeros(key.size, dtype=np.float64)
+        that = np.zeros(key.size, dtype=np.float64)
+        this[np.searchsorted(key, self.key)] = self.q
+        that[np.searchsorted(key, other.key)] = other.q
 
+        return np.unravel_index(key, self.shape), this, that
 
-class HeadFile(dict):
-    """
-    Class to grab head file information out of the rigid flopy structure
-    and use it for comparisons
 
-    :param ws: (str)
-    :param headname: (str) head file name
-    :param precision: (str) single or double are only valid params
+class ListBudgetParser(object):
     """
-    def __init__(self, ws, headname, precision='single'):
-        self.__ws = ws
-        self.__name = headname
-        self.__precision = precision
-        self.__file = os.path.join(ws, headname)
-        self.__ignore = ('totim', 'time_step', 'stress_period')
-        self.__binary = True
-        self.success = True
-        self.head = np.array([])
-        self.fail_list = []
+    Listing file budget parser that finds the volumetric budget blocks
+    with compiled byte level regular expressions over a memory map of the
+    listing file. Budget rates are written directly into preallocated
+    column arrays, using the same column names as flopy's MfListBudget,
+    including the time step length (tslen) in days from the time summary
+    after each budget block. Rates that cannot be parsed, such as the
+    asterisks of an overflowed field, are left as nan and listed in the
+    unparsed attribute as (kstp, kper, column name, text) tuples.
+
+    With persist, the (kstp, kper, byte offset) index of the budget blocks
+    is saved next to the listing file as <listing file>.idx.npz and reused
+    while the listing file size and modification time are unchanged, so
+    subsets of time steps can be loaded without rescanning the file.
+
+    :param filename: (str) listing file path
+    :param budgetkey: (str) text that starts each budget block
+    :param persist: (bool) save and reuse the budget block index file
+    """
+    budget_line = re.compile(br"^[ \t]*([^=\r\n]*?)[ \t]*=[ \t]*(\S+)"
+                             br"[ \t]+[^=\r\n]*?=[ \t]*(\S+)", re.M)
+    block_end = re.compile(br"PERCENT DISCREPANCY[^\n]*\n?")
+    time_step_length = re.compile(br"TIME STEP LENGTH[ \t=]*([^\r\n]*)")
+    out_tag = re.compile(br"OUT:")
+
+    def __init__(self, filename,
+                 budgetkey="VOLUMETRIC BUDGET FOR ENTIRE MODEL",
+                 persist=False):
+        self.__file = filename
+        self.__index_file = filename + ".idx.npz"
+        self.__persist = persist
+        self.__block_start = re.compile(re.escape(budgetkey.encode('ascii')) +
+                                        br"[^\n]*?TIME STEP\s*(\d+)[\s,]*"
+                                        br"STRESS PERIOD\s*(\d+)")
+        self.kstp = np.zeros(0, dtype=np.int32)
+        self.kper = np.zeros(0, dtype=np.int32)
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.unparsed = []
+
+    def __open(self):
+        with open(self.__file, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def index(self):
+        """
+        Method to find the kstp, kper and byte offset of every budget
+        block in the listing file
+        """
+        stat = os.stat(self.__file)
+        if self.__persist and self.__load_index(stat):
+            return
 
-        self.__simple_binary()
-        super(HeadFile, self).__init__()
+        mm = self.__open()
+        try:
+            blocks = [(int(m.group(1)), int(m.group(2)), m.start())
+                      for m in self.__block_start.finditer(mm)]
 
-        if self.success:
-            if self.__binary:
+        finally:
+            mm.close()
 
-                self.__get_binary_heads()
-            else:
-                # try reading it as a formatted head file
-                self.__get_formatted_heads()
+        blocks = np.array(blocks, dtype=np.int64).reshape((-1, 3))
+        self.kstp = blocks[:, 0].astype(np.int32)
+        self.kper = blocks[:, 1].astype(np.int32)
+        self.offsets = blocks[:, 2]
 
-    def __simple_binary(self):
+        if self.__persist:
+            self.__save_index(stat)
+
+    def __load_index(self, stat):
         """
-        Extremely simple binary file checker! Works for head files, but
-        not comprehensive by any nature!
+        Loads a persisted budget block index if it is still current
+
+        :param stat: os.stat result for the listing file
         :return: bool
         """
-        try:
-            with open(self.__file) as bc:
-                line = bc.readline()
+        if not os.path.isfile(self.__index_file):
+            return False
 
-            if b'\x00' in line:
-                return
+        try:
+            idx = np.load(self.__index_file)
+            if int(idx['size']) != stat.st_size or \
+                    float(idx['mtime']) != stat.st_mtime:
+                return False
 
-            self.__binary = False
+            self.kstp = idx['kstp']
+            self.kper = idx['kper']
+            self.offsets = idx['offsets']
 
         except:
-            self.success = False
+            return False
 
-    def __get_binary_heads(self):
-        try:
-            head = fp.utils.HeadFile(self.__file, precision=self.__precision)
+        return True
 
-        except:
-            self.success = False
-            self.fail_list.append("no_file")
-            return
+    def __save_index(self, stat):
+        """
+        Saves the budget block index next to the listing file. Read only
+        output directories are skipped silently.
 
+        :param stat: os.stat result for the listing file
+        """
         try:
-            self.head = head.get_alldata()
+            np.savez(self.__index_file, kstp=self.kstp, kper=self.kper,
+                     offsets=self.offsets, size=stat.st_size,
+                     mtime=stat.st_mtime)
 
-        except:
-            self.success = False
-            self.fail_list.append('head')
+        except (IOError, OSError):
+            pass
 
-    def __get_formatted_heads(self):
-        try:
-            head = fp.utils.FormattedHeadFile(self.__file,
-                                              precision=self.__precision)
-        except:
-            return
+    def select(self, kper=None, last=None):
+        """
+        Method to select budget blocks by stress period and/or the last
+        number of time steps
 
-        try:
-            self.head = head.get_alldata()
-            self.success = True
-            self.fail_list = []
-        except:
-            self.fail_list = ['head']
-            return
+        :param kper: (int or list) one based stress period number(s)
+        :param last: (int) number of time steps at the end of the file,
+            at least one
+        :return: np.array of block numbers
+        """
+        if last is not None and last < 1:
+            raise ValueError("last must be at least 1: {}".format(last))
 
+        if self.offsets.size == 0:
+            self.index()
 
-class CellByCellBudget(dict):
-    """
-    Class to grab cell budget information out of flopy structure and
-    use it for budget comparisons. Sets budget items to an over-ridden
-    dictionary object
+        blocks = np.arange(self.offsets.size)
+        if kper is not None:
+            blocks = blocks[np.isin(self.kper, kper)]
 
-    :param ws: (str) output directory workspace
-    :param budgetname: (str) budget file name
-    :param precision: (str) single or double are only valid params
-    """
+        if last is not None:
+            blocks = blocks[-last:]
 
-    adjust = {"MNW2_IN": "MNW_IN",
-              "MNW2_OUT": "MNW_OUT"}
+        return blocks
 
-    def __init__(self, ws, budgetname, precision='single'):
-        self.__ws = ws
-        self.__name = budgetname
-        self.__precision = precision
-        self.__file = os.path.join(ws, budgetname)
-        self.__ignore = ('totim', 'time_step', 'stress_period')
-        self.success = True
-        self.fail_list = []
+    @staticmethod
+    def __entries(block):
+        """
+        Parses the budget rates of a single budget block into an ordered
+        list of (column name, rate string) pairs, named like flopy
 
-        super(CellByCellBudget, self).__init__()
-        self.__get_budget()
+        :param block: (bytes) budget block text
+        :return: list of tuples
+        """
+        out = ListBudgetParser.out_tag.search(block)
+        out_pos = len(block) if out is None else out.start()
+
+        entries = []
+        counts = {}
+        tag = "IN"
+        for m in ListBudgetParser.budget_line.finditer(block):
+            entry = m.group(1).decode('ascii').strip()
+            if tag == "IN" and m.start() > out_pos:
+                tag = "OUT"
+                counts = {}
+
+            if entry.upper().endswith(tag):
+                if " - " in entry:
+                    key = entry.replace(" ", "")
+                else:
+                    key = entry.replace(" ", "_")
 
-    def __get_budget(self):
-        try:
-            bud = fp.utils.CellBudgetFile(self.__file,
-                                          precision=self.__precision)
-            records = bud.unique_record_names()
+            elif "PERCENT DISCREPANCY" in entry.upper():
+                key = entry.replace(" ", "_")
 
-        except:
-            self.success = False
-            self.fail_list.append('no_file')
-            return
+            else:
+                entry = entry.replace(" ", "_")
+                if entry in counts:
+                    counts[entry] += 1
+                    entry = "{}{}".format(entry, counts[entry] + 1)
+                else:
+                    counts[entry] = 0
 
-        for name in records:
-            try:
-                if name.strip().lower() in self.__ignore:
-                    pass
+                key = "{}_{}".format(entry, tag)
+
+            entries.append((key, m.group(3)))
+
+        return entries
+
+    @staticmethod
+    def __tslen(text):
+        """
+        Gets the time step length from the TIME STEP LENGTH line of a time
+        summary, in days like flopy's MfListBudget. Listing files without
+        time units print a single value.
+
+        :param text: (bytes) text following TIME STEP LENGTH
+        :return: (bytes) time step length text
+        """
+        values = text.split()
+        if len(values) >= 5:
+            return values[3]
+
+        elif values:
+            return values[0]
+
+        return text
+
+    def get_budget(self, blocks=None):
+        """
+        Method to parse budget blocks into column arrays
+
+        :param blocks: (np.array) optional index of the blocks to parse,
+            all blocks are parsed by default
+        :return: (dict) column name: np.array of budget rates
+        """
+        if self.offsets.size == 0:
+            self.index()
+
+        if blocks is None:
+            blocks = np.arange(self.offsets.size)
+
+        offsets = self.offsets[blocks]
+        # the time summary of a block is before the start of the next block
+        bounds = np.append(self.offsets, -1)[
+            np.searchsorted(self.offsets, offsets, side='right')]
+
+        budget = {}
+        self.unparsed = []
+        mm = self.__open()
+        try:
+            for ix, offset in enumerate(offsets):
+                end = ListBudgetParser.block_end.search(mm, int(offset))
+                if end is None:
+                    stop = len(mm)
                 else:
-                    self[name.strip().upper()] = np.array(bud.get_data(text=name,
-                                                                       full3D=True))
-            except:
-                self.sucess = False
-                self.fail_list.append(name)
+                    stop = end.end()
 
-        for key, new_key in CellByCellBudget.adjust.items():
-            if key in self:
-                self[new_key] = self[key]
-                self.pop(key)
+                entries = ListBudgetParser.__entries(mm[offset:stop])
+                bound = len(mm) if bounds[ix] < 0 else int(bounds[ix])
+                tslen = ListBudgetParser.time_step_length.search(mm, stop,
+                                                                 bound)
+                if tslen is not None:
+                    entries.append(
+                        ("tslen", ListBudgetParser.__tslen(tslen.group(1))))
 
-            else:
-                pass
+                for key, value in entries:
+                    if key not in budget:
+                        budget[key] = np.full(offsets.size, np.nan)
 
-    def keys(self):
-        return [key for key in sorted(self)]
+                    try:
+                        budget[key][ix] = float(value)
+                    except ValueError:
+                        self.unparsed.append(
+                            (int(self.kstp[blocks[ix]]),
+                             int(self.kper[blocks[ix]]), key,
+                             value.decode('ascii', 'replace')))
+
+        finally:
+            mm.close()
+
+        return budget
 
 
 class ListBudget(dict):
     """
-    Class to grab cell budget information out of flopy structure and
-    use it for budget comparisons. Sets budget items to an over-ridden
-    dictionary object
+    Class to grab cell budget information out of a listing file with
+    <ListBudgetParser> and use it for budget comparisons. Sets budget
+    items to an over-ridden dictionary object
 
     :param ws: (str) output directory workspace
     :param listname: (str) listing file name
+    :param kper: (int or list) optional one based stress period number(s)
+        to load, all stress periods are loaded by default
+    :param last: (int) optional number of time steps at the end of the
+        listing file to load. Selections save the budget block index of
+        <ListBudgetParser> next to the listing file
+    :param cache: (bool) load the budget through the <OutputCache>, the
+        kper and last selection is part of the cache key
+
+    Budget rates that cannot be parsed are nan, they are reported to the
+    error file and add 'rates' to the fail_list.
     """
 
     adjust = {"MNW2_IN": "MNW_IN",
               "MNW2_OUT": "MNW_OUT"}
 
-    def __init__(self, ws, listname, precision='single'):
+    @profiled('ListBudget')
+    def __init__(self, ws, listname, precision='single', kper=None,
+                 last=None, cache=False):
         self.__ws = ws
         self.__name = listname
         self.__precision = precision
+        self.__kper = kper
+        self.__last = last
+        self.__cache = cache
         self.__file = os.path.join(ws, listname)
         self.__ignore = ('totim', 'time_step', 'stress_period')
         self.success = True
@@ -216,30 +2264,43 @@ class ListBudget(dict):
         self.__get_budget()
 
     def __get_budget(self):
+        if self.__cache:
+            cached = OutputCache.load(self.__file, 'ListBudget',
+                                      self.__params())
+            if cached is not None:
+                self.update(cached[1])
+                return
+
         try:
-            mflist = fp.utils.MfListBudget(self.__file)
-            budget = mflist.get_budget()[0]
+            # the block index is only saved for selections, full loads do
+            # not write to the output workspace
+            selection = self.__kper is not None or self.__last is not None
+            parser = ListBudgetParser(self.__file, persist=selection)
+            blocks = None
+            if selection:
+                blocks = parser.select(kper=self.__kper, last=self.__last)
+
+            budget = parser.get_budget(blocks)
 
         except:
             self.success = False
             self.fail_list.append('no_file')
             return
 
-        if budget is None:
+        if parser.unparsed:
+            self.fail_list.append('rates')
+            ErrorFile.write_error(
+                ListBudget.__unparsed_message(self.__file, parser.unparsed))
+
+        if not budget:
             self.success = False
             return
 
-        for name in budget.dtype.names:
-            try:
-                if name.strip().lower() in self.__ignore:
-                    pass
-                else:
-                    self[name.strip().upper()] = np.array([rec[name]
-                                                           for rec in budget])
-
-            except:
-                self.success = False
-                self.fail_list.append(name)
+        for name, data in budget.items():
+            if name.strip().lower() in self.__ignore:
+                pass
+            else:
+                self[name.strip().upper()] = data
 
         for key, new_key in ListBudget.adjust.items():
             if key in self:
@@ -249,6 +2310,40 @@ class ListBudget(dict):
             else:
                 pass
 
+        if self.__cache and not self.fail_list:
+            OutputCache.save(self.__file, 'ListBudget', self.items(),
+                             params=self.__params())
+
+    @staticmethod
+    def __unparsed_message(filename, unparsed):
+        """
+        Formats the budget rates that could not be parsed for the error
+        file, the first FailureReport.top_n are listed
+
+        :param filename: (str) listing file path
+        :param unparsed: (list) (kstp, kper, column name, text) tuples
+        :return: (str) error message
+        """
+        err_msg = "Unparsable listing file budget rates: {}, {} values " \
+                  "set to nan\n".format(filename, len(unparsed))
+        for kstp, kper, key, text in unparsed[:FailureReport.top_n]:
+            err_msg += "    kstp: {}, kper: {}, budget item: {}, " \
+                       "value: {}\n".format(kstp, kper, key.upper(), text)
+
+        return err_msg
+
+    def __params(self):
+        """
+        Method to get the reader parameters of the cache key
+
+        :return: (dict) stress period selection
+        """
+        kper = self.__kper
+        if kper is not None:
+            kper = [int(i) for i in np.atleast_1d(kper)]
+
+        return {'kper': kper, 'last': self.__last}
+
     def keys(self):
         return [key for key in sorted(self)]
 
@@ -260,6 +2355,7 @@ class FarmOutputs(dict):
 
     :param ws: (str) directory of output file
     :param outname: (str) name of the output file
+    :param cache: (bool) load the parsed columns through the <OutputCache>
     """
     ignore = ('active',
               'date_start',
@@ -273,9 +2369,14 @@ class FarmOutputs(dict):
     isint = ('per', 'stp', 'fid', 'crop')
     isstr = ('crop_name')
 
-    def __init__(self, ws, outname, index='fid'):
+    # rows parsed at a time
+    chunk_rows = 65536
+
+    @profiled('FarmOutputs')
+    def __init__(self, ws, outname, index='fid', cache=False):
         self.__ws = ws
         self.__name = outname
+        self.__cache = cache
         self.__file = os.path.join(ws, outname)
         self.__header = []
         self.success = True
@@ -296,220 +2397,741 @@ class FarmOutputs(dict):
 
     def __get_budget(self):
         """
-        Reader definition for farm process output files, sets data
-        to FarmOutput dictionary
+        Reader definition for farm process output files. The file is parsed
+        in chunks into typed column arrays, which are grouped by the index
+        column so each farm holds array views instead of python lists
+        """
+        if self.__cache:
+            cached = OutputCache.load(self.__file,
+                                      'FarmOutputs.{}'.format(self.__index))
+            if cached is not None:
+                extra, arrays = cached
+                self.__header = extra['header']
+                self.__set_groups(extra['keys'], arrays[0][1],
+                                  arrays[1:])
+                return
+
+        with open(self.__file, 'rb') as fout:
+            self.__get_header(fout.readline().decode('ascii'))
+            if 'per' not in self.__header and 'kper' not in self.__header:
+                raise ValueError("No stress period column in header")
+
+            fids, columns = self.__read_columns(fout)
+
+        # group rows by farm, stable so time order is kept within a farm
+        order = np.argsort(fids, kind='mergesort')
+        fids = fids[order]
+        columns = [(h, column[order]) for h, column in columns]
+
+        keys, starts = np.unique(fids, return_index=True)
+        bounds = np.append(starts, fids.size)
+        self.__set_groups(keys.tolist(), bounds, columns)
+
+        if self.__cache:
+            OutputCache.save(self.__file,
+                             'FarmOutputs.{}'.format(self.__index),
+                             [('bounds', bounds)] + columns,
+                             {'header': self.__header,
+                              'keys': keys.tolist()})
+
+    def __read_columns(self, fout):
+        """
+        Parses the rows of a farm process output file into typed column
+        arrays. Rows are read FarmOutputs.chunk_rows lines at a time and
+        only the kept columns of each chunk are converted, so peak memory
+        is the typed columns plus the tokens of one chunk.
+
+        :param fout: open binary file handle, positioned after the header
+        :return: (tuple) np.array of index values, list of (name, np.array)
+            columns in file row order
+        """
+        ncol = len(self.__header)
+        fid_idx = self.__header.index(self.__index)
+        if self.__itype is str:
+            fid_type = str
+        else:
+            fid_type = np.int64
+
+        kept = []
+        for ix, h in enumerate(self.__header):
+            if h in FarmOutputs.ignore:
+                pass
+
+            elif h.startswith('v-'):
+                pass
+
+            elif h in FarmOutputs.isint:
+                kept.append((ix, h, np.int64))
+
+            elif h in FarmOutputs.isstr:
+                kept.append((ix, h, str))
+
+            else:
+                kept.append((ix, h, np.float64))
+
+        fids = []
+        chunks = [[] for _ in kept]
+        while True:
+            lines = list(itertools.islice(fout, FarmOutputs.chunk_rows))
+            if not lines:
+                break
+
+            tokens = b" ".join(lines).split()
+            del lines
+            if len(tokens) % ncol != 0:
+                raise ValueError("Inconsistent number of columns")
+
+            table = np.array(tokens).reshape((-1, ncol))
+            del tokens
+
+            fids.append(table[:, fid_idx].astype(fid_type))
+            for chunk, (ix, h, dtype) in zip(chunks, kept):
+                chunk.append(table[:, ix].astype(dtype))
+
+            del table
+
+        if not fids:
+            return np.zeros(0, dtype=fid_type), \
+                [(h, np.zeros(0, dtype=dtype)) for ix, h, dtype in kept]
+
+        columns = [(h, np.concatenate(chunk))
+                   for chunk, (ix, h, dtype) in zip(chunks, kept)]
+        return np.concatenate(fids), columns
+
+    def __set_groups(self, keys, bounds, columns):
+        """
+        Sets each farm to array views of its rows in the grouped columns
+
+        :param keys: (list) farm index values, in row order
+        :param bounds: (np.array) first row of each farm and the row count
+        :param columns: list of (name, np.array) grouped columns
+        """
+        for ix, fid in enumerate(keys):
+            start, stop = bounds[ix], bounds[ix + 1]
+            self[fid] = {}
+            for h, column in columns:
+                self[fid][h] = column[start:stop]
+
+    def __get_header(self, line):
+        self.__header = line.lower().strip().split()
+
+    def __set_timestep_length(self, timeunit=None):
+        for k, v in self.items():
+            if timeunit is None:
+                if 'days' in v:
+                    self.__timeunit = 'days'
+                    cum_time = np.array(v['days'])
+                    break
+
+                elif 'minutes' in v:
+                    self.__timeunit = 'minutes'
+                    cum_time = np.array(v['minutes'])
+                    break
+
+                elif 'years' in v:
+                    self.__timeunit = 'years'
+                    cum_time = np.array(v['years'])
+                    break
+
+                elif 'seconds' in v:
+                    self.__timeunit = 'seconds'
+                    cum_time = np.array(v['seconds'])
+                    break
+
+                else:
+                    raise AssertionError("Cant discerne time step from data")
+            else:
+                self.__timeunit = timeunit.lower()
+                cum_time = np.array(v['delt'])
+
+        # ts_time = np.zeros(cum_time.shape)
+        # ts_time[0] = cum_time[0]
+
+        # ts_time[1:] = cum_time[1:] - cum_time[:-1]
+
+        for k in self:
+            self[k]['ts_time'] = cum_time
+
+    def __calculate_harmonic_mean(self, data, tslen, group):
+        """
+        Calculates time weighted means of every column for each group of
+        rows in a single reduction
+
+        :param data: (np.ndarray) (nrows, ncolumns) data sorted by group
+        :param tslen: (np.ndarray) ts length of each row, sorted by group
+        :param group: (np.ndarray) sorted group number of each row
+        :return: (tuple) np.ndarray (ngroups, ncolumns) of means,
+            np.ndarray index of the first row of each group
+        """
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        numerator = np.add.reduceat(data * tslen[:, np.newaxis], starts,
+                                    axis=0)
+        denominator = np.add.reduceat(tslen, starts)
+
+        return numerator / denominator[:, np.newaxis], starts
+
+    @profiled('FarmOutputs.raw_to_stress_period')
+    def raw_to_stress_period(self, timeunit=None):
+        """
+        Converts raw data to stress period based fluxes. The rows of all
+        farms are stacked and every column is reduced by (farm, kper) in
+        one batched group by.
         """
-        with open(self.__file) as fout:
-            self.__get_header(fout.readline())
-            if 'per' in self.__header:
-                kper_idx = self.__header.index('per')
+        ignore = ('per', 'stp', 'ts_time', 'days', 'delt', 'crop_name',
+                  'kper', 'kstp', 'crop')
+        self.__set_timestep_length(timeunit=timeunit)
+
+        if 'per' in self.__header:
+            per_n = 'per'
+        else:
+            per_n = 'kper'
+
+        fids = self.keys()
+        if not fids:
+            return
+
+        keys = [key for key in self[fids[0]] if key not in ignore]
+        pers = [np.asarray(self[fid][per_n]) for fid in fids]
+        nrows = [per.size for per in pers]
+
+        if timeunit is not None:
+            # stress period end time is the cumulative sum of delt
+            times = [np.cumsum(self[fid]['delt']) for fid in fids]
+        else:
+            times = [np.asarray(self[fid][self.__timeunit]) for fid in fids]
+
+        per = np.concatenate(pers)
+        farm = np.repeat(np.arange(len(fids)), nrows)
+        time = np.concatenate(times)
+        tslen = np.concatenate([np.asarray(self[fid]['ts_time'])[:n]
+                                for fid, n in zip(fids, nrows)])
+        data = np.column_stack([np.concatenate([self[fid][key]
+                                                for fid in fids])
+                                for key in keys]).astype(np.float64)
+
+        group = farm * (np.max(per) + 1) + per
+        order = np.argsort(group, kind='mergesort')
+        sp_data, starts = self.__calculate_harmonic_mean(data[order],
+                                                         tslen[order],
+                                                         group[order])
+
+        # time at the last row of each (farm, kper) group
+        stops = np.r_[starts[1:], group.size]
+        new_time = time[order[stops - 1]]
+        bounds = np.searchsorted(farm[order][starts],
+                                 np.arange(len(fids) + 1))
+
+        for ix, fid in enumerate(fids):
+            datadict = self[fid]
+            start, stop = bounds[ix], bounds[ix + 1]
+            for kx, key in enumerate(keys):
+                datadict[key] = sp_data[start:stop, kx]
+
+            datadict.pop('ts_time')
+            if 'stp' in self.__header:
+                datadict.pop('stp')
             else:
-                kper_idx = self.__header.index('kper')
+                datadict.pop('kstp')
+
+            datadict[self.__timeunit] = new_time[start:stop]
+            datadict[per_n] = np.arange(1, np.max(pers[ix]) + 1, dtype=int)
+
+    def keys(self):
+        return [key for key in sorted(self)]
+
+
+class SwrBinaryFile(object):
+    """
+    Memory mapped reader for the binary outputs of the Surface-Water
+    Routing (SWR) process: reach stage, reach group budget, reach flow,
+    reach aquifer exchange and structure files. Time step headers are
+    parsed once on construction into compact arrays and the values of a
+    range of time steps are exposed as strided views of the np.memmap, so
+    values are only paged in from disk when they are compared.
+
+    The SWR type of a file is found from its extension in
+    SwrBinaryFile.extensions unless it is set with swrtype.
+
+    :param ws: (str) workspace
+    :param swrname: (str) swr binary output file name
+    :param swrtype: (str) stage, budget, flow, exchange or structure
+    :param precision: (str) single, double or auto
+    """
+    extensions = {'.stg': 'stage',
+                  '.rgb': 'budget',
+                  '.flow': 'flow',
+                  '.flw': 'flow',
+                  '.qaq': 'exchange',
+                  '.str': 'structure'}
+
+    # (value names, name of one item) of each swr type, items of exchange
+    # and structure files are listed per reach in each time step
+    items = {'stage': (('stage',), 'reach'),
+             'budget': (('stage', 'qsflow', 'qlatflow', 'quzflow', 'rain',
+                         'evap', 'qbflow', 'qeflow', 'qexflow', 'qbcflow',
+                         'qcrflow', 'dv', 'inf-out', 'volume'),
+                        'reach group'),
+             'flow': (('flow', 'velocity'), 'connection'),
+             'exchange': (('bottom', 'stage', 'depth', 'head', 'wetper',
+                           'cond', 'headdiff', 'exchange'), 'exchange item'),
+             'structure': (('usstage', 'dsstage', 'gateelev', 'opening',
+                            'strflow'), 'structure item')}
+
+    @profiled('SwrBinaryFile')
+    def __init__(self, ws, swrname, swrtype=None, precision='auto'):
+        self.__file = os.path.join(ws, swrname)
+        self.__mm = None
+        self.__offsets = np.zeros(0, dtype=np.int64)
+        self.__realtype = np.dtype('<f8')
+        self.__itemsize = 0
+        self.__voffset = 0
+        self.success = True
+        self.fail_list = []
+        self.swrtype = swrtype
+        self.precision = precision
+        self.nrecord = 0
+        self.connectivity = None
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.totim = np.zeros(0)
+        self.dt = np.zeros(0)
+        self.kswrkstpkper = np.zeros((0, 3), dtype=np.int32)
+
+        if self.swrtype is None:
+            ext = os.path.splitext(swrname)[1].lower()
+            self.swrtype = SwrBinaryFile.extensions.get(ext)
+
+        if self.swrtype not in SwrBinaryFile.items:
+            self.success = False
+            self.fail_list.append('swrtype')
+            return
 
-            fid_idx = self.__header.index(self.__index)
+        try:
+            self.__get_records()
 
-            while True:
-                line = fout.readline()
-                if not line:
-                    break
+        except:
+            self.success = False
+            self.fail_list.append('swr')
 
-                t = line.strip().split()
-                fid = self.__itype(t[fid_idx])
+    @property
+    def names(self):
+        return SwrBinaryFile.items[self.swrtype][0]
 
-                if fid not in self:
-                    self[fid] = {}
+    @property
+    def item_name(self):
+        return SwrBinaryFile.items[self.swrtype][1]
 
-                    for h in self.__header:
-                        if h in FarmOutputs.ignore:
-                            pass
+    @property
+    def ntime(self):
+        return self.totim.size
 
-                        elif h.startswith('v-'):
-                            pass
+    @property
+    def dtype(self):
+        return self.__realtype
 
-                        else:
-                            self[fid][h] = []
+    def __get_records(self):
+        """
+        Sets up the memory map and the time step index, trying double and
+        then single precision when the precision is auto
+        """
+        if os.path.getsize(self.__file) == 0:
+            raise ValueError("Empty swr file")
 
-                    self.__set_data(fid, t)
+        self.__mm = np.memmap(self.__file, dtype=np.uint8, mode='r')
+        if self.precision != 'auto':
+            self.__scan(self.precision)
+            return
 
-                else:
-                    self.__set_data(fid, t)
+        for precision in ('double', 'single'):
+            try:
+                self.__scan(precision)
+                self.precision = precision
+                return
 
-    def __set_data(self, fid, data):
-        for ix, h in enumerate(self.__header):
-            if h in FarmOutputs.ignore:
+            except ValueError:
                 pass
 
-            else:
-                if h.startswith('v-'):
-                    pass
-
-                elif h in FarmOutputs.isint:
-                    self[fid][h].append(int(data[ix]))
+        raise ValueError("Precision of swr file cannot be found")
 
-                elif h in FarmOutputs.isstr:
-                    self[fid][h].append(data[ix])
+    def __scan(self, precision):
+        """
+        Walks the time step headers of the file. Stage, budget and flow
+        time steps have a fixed size and are indexed without a walk.
 
-                else:
-                    self[fid][h].append(float(data[ix]))
+        :param precision: (str) single or double
+        """
+        if precision == 'double':
+            self.__realtype = np.dtype('<f8')
+        else:
+            self.__realtype = np.dtype('<f4')
+
+        real = self.__realtype
+        mm = self.__mm
+        filesize = mm.size
+        header_dtype = np.dtype([('totim', real), ('dt', real),
+                                 ('kper', '<i4'), ('kstp', '<i4'),
+                                 ('kswr', '<i4')])
+        nvalue = len(self.names)
+        if self.swrtype == 'exchange':
+            # layer number followed by the exchange values
+            self.__itemsize = 4 + nvalue * real.itemsize
+            self.__voffset = 4
+        else:
+            self.__itemsize = nvalue * real.itemsize
+            self.__voffset = 0
+
+        ints = lambda pos, count: np.frombuffer(mm, dtype='<i4',
+                                                count=count, offset=pos)
+        pos = 0
+        if self.swrtype == 'flow':
+            nreach, self.nrecord = [int(i) for i in ints(0, 2)]
+            pos = 8
+            conn = []
+            for reach in range(nreach):
+                nconn = int(ints(pos, 1)[0])
+                pairs = ints(pos + 4, 2 * nconn).reshape((nconn, 2))
+                conn.append(np.column_stack(
+                    (np.full(nconn, reach), pairs - 1)))
+                pos += 4 + 8 * nconn
+
+            self.connectivity = np.concatenate(conn) if conn else \
+                np.zeros((0, 3), dtype=np.int64)
+            if len(self.connectivity) != self.nrecord:
+                raise ValueError("Invalid flow connectivity")
 
-    def __get_header(self, line):
-        self.__header = line.lower().strip().split()
+        else:
+            self.nrecord = int(ints(0, 1)[0])
+            pos = 4
+
+        if self.nrecord < 1:
+            raise ValueError("Invalid number of swr records")
+
+        hsize = header_dtype.itemsize
+        if self.swrtype in ('exchange', 'structure'):
+            # each time step starts with the number of items of each reach
+            offsets, counts, headers = [], [], []
+            lsize = 4 * self.nrecord
+            while pos < filesize:
+                if pos + lsize + hsize > filesize:
+                    raise ValueError("Truncated swr time step header")
+
+                items = ints(pos, self.nrecord)
+                if np.any(items < 0):
+                    raise ValueError("Invalid swr item list")
+
+                count = int(items.sum())
+                if pos + lsize + hsize + count * self.__itemsize > filesize:
+                    raise ValueError("Truncated swr time step")
+
+                headers.append(np.frombuffer(mm, dtype=header_dtype,
+                                             count=1, offset=pos + lsize))
+                offsets.append(pos + lsize + hsize)
+                counts.append(count)
+                pos += lsize + hsize + count * self.__itemsize
+
+            headers = np.concatenate(headers) if headers else \
+                np.zeros(0, dtype=header_dtype)
 
-    def __set_timestep_length(self, timeunit=None):
-        for k, v in self.items():
-            if timeunit is None:
-                if 'days' in v:
-                    self.__timeunit = 'days'
-                    cum_time = np.array(v['days'])
-                    break
+        else:
+            recsize = hsize + self.nrecord * self.__itemsize
+            ntime, extra = divmod(filesize - pos, recsize)
+            if extra or ntime < 1:
+                raise ValueError("Swr file size does not match records")
 
-                elif 'minutes' in v:
-                    self.__timeunit = 'minutes'
-                    cum_time = np.array(v['minutes'])
-                    break
+            headers = np.ndarray((ntime,), dtype=header_dtype, buffer=mm,
+                                 offset=pos, strides=(recsize,))
+            offsets = pos + hsize + np.arange(ntime, dtype=np.int64) * recsize
+            counts = np.full(ntime, self.nrecord)
 
-                elif 'years' in v:
-                    self.__timeunit = 'years'
-                    cum_time = np.array(v['years'])
-                    break
+        if not SwrBinaryFile.__valid_headers(headers):
+            raise ValueError("Invalid swr time step headers")
 
-                elif 'seconds' in v:
-                    self.__timeunit = 'seconds'
-                    cum_time = np.array(v['seconds'])
-                    break
+        steps = np.column_stack((headers['kswr'], headers['kstp'],
+                                 headers['kper']))
 
-                else:
-                    raise AssertionError("Cant discerne time step from data")
-            else:
-                self.__timeunit = timeunit.lower()
-                cum_time = np.array(v['delt'])
+        self.__offsets = np.asarray(offsets, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.totim = np.array(headers['totim'], dtype=np.float64)
+        self.dt = np.array(headers['dt'], dtype=np.float64)
+        self.kswrkstpkper = np.array(steps, dtype=np.int32)
 
-        # ts_time = np.zeros(cum_time.shape)
-        # ts_time[0] = cum_time[0]
+    @staticmethod
+    def __valid_headers(headers):
+        """
+        Checks that decoded time step headers are plausible, so a file
+        read with the wrong precision is rejected even when its size fits
 
-        # ts_time[1:] = cum_time[1:] - cum_time[:-1]
+        :param headers: (np.ndarray) time step header records
+        :return: bool
+        """
+        if headers.size == 0:
+            return False
+
+        totim = headers['totim'].astype(np.float64)
+        dt = headers['dt'].astype(np.float64)
+        kper = headers['kper'].astype(np.int64)
+        kstp = headers['kstp'].astype(np.int64)
+        if not (np.all(np.isfinite(totim)) and np.all(np.isfinite(dt))):
+            return False
+
+        if np.any(dt <= 0) or np.any(totim <= 0) or \
+                np.any(np.diff(totim) <= 0):
+            return False
+
+        if np.any(kper < 1) or np.any(kstp < 1) or \
+                np.any(headers['kswr'] < 1):
+            return False
+
+        # stress periods and time steps within a period never go back
+        dper = np.diff(kper)
+        return bool(np.all(dper >= 0) and
+                    np.all(np.diff(kstp)[dper == 0] >= 0))
+
+    def chunks(self, chunk_size=4 * 1024 ** 2):
+        """
+        Generator of time step ranges holding about chunk_size bytes of
+        values, time steps in a range have the same number of items
 
-        for k in self:
-            self[k]['ts_time'] = cum_time
+        :param chunk_size: (int) bytes of values per range
+        :return: (t0, t1) time step ranges
+        """
+        t0 = 0
+        while t0 < self.ntime:
+            count = self.counts[t0]
+            t1 = t0 + 1
+            nbytes = count * self.__itemsize
+            while t1 < self.ntime and self.counts[t1] == count and \
+                    nbytes + count * self.__itemsize <= chunk_size:
+                nbytes += count * self.__itemsize
+                t1 += 1
+
+            yield t0, t1
+            t0 = t1
+
+    def get_values(self, t0, t1):
+        """
+        Method to get the values of a range of time steps as a strided
+        view of the file, every time step of the range must have the same
+        number of items
 
-    def __calculate_harmonic_mean(self, data_dict):
+        :param t0: (int) first time step
+        :param t1: (int) end of the range
+        :return: (np.memmap view) (ntime, nitem, nvalue) array
         """
-        Calculates a harmonic mean using the kper data and ts length
-        :param data_dict: dictionary with data, tslen
-        :return: np.ndarray
+        count = int(self.counts[t0])
+        if np.any(self.counts[t0:t1] != count):
+            raise ValueError("Time steps have different item counts")
+
+        step = self.__step(t0, t1)
+        return np.ndarray((t1 - t0, count, len(self.names)),
+                          dtype=self.__realtype, buffer=self.__mm,
+                          offset=int(self.__offsets[t0]) + self.__voffset,
+                          strides=(step, self.__itemsize,
+                                   self.__realtype.itemsize))
+
+    def get_layers(self, t0, t1):
+        """
+        Method to get the layer numbers of exchange items of a range of
+        time steps, see get_values()
+
+        :param t0: (int) first time step
+        :param t1: (int) end of the range
+        :return: (np.memmap view) (ntime, nitem) array
         """
-        sp_data = []
-        for per, data in sorted(data_dict.items()):
-            numerator = 0
-            for ix, v in enumerate(data['data']):
+        if self.swrtype != 'exchange':
+            return None
 
-                numerator += (v * data['tslen'][ix])
+        count = int(self.counts[t0])
+        return np.ndarray((t1 - t0, count), dtype='<i4', buffer=self.__mm,
+                          offset=int(self.__offsets[t0]),
+                          strides=(self.__step(t0, t1), self.__itemsize))
 
-            sp_data.append(numerator / np.sum(data['tslen']))
+    def __step(self, t0, t1):
+        """
+        Method to get the byte stride between time steps of a range
+        """
+        if t1 - t0 > 1:
+            return int(self.__offsets[t0 + 1] - self.__offsets[t0])
 
-        return np.array(sp_data)
+        return self.__itemsize * max(int(self.counts[t0]), 1)
 
-    def raw_to_stress_period(self, timeunit=None):
+    def get_time(self, t):
         """
-        Converts raw data to stress period based fluxes.
+        Method to get the values of a single time step
+
+        :param t: (int) time step
+        :return: (np.ndarray) (nitem, nvalue) array
         """
-        ignore = ('per', 'stp', 'ts_time', 'days', 'delt', 'crop_name',
-                  'kper', 'kstp', 'crop')
-        self.__set_timestep_length(timeunit=timeunit)
+        return self.get_values(t, t + 1)[0]
 
-        if 'per' in self.__header:
-            per_n = 'per'
-        else:
-            per_n = 'kper'
 
-        for fid, datadict in self.items():
-            per = datadict[per_n]
-            ts_time = datadict['ts_time']
+class CompareKernel(object):
+    """
+    Relative error kernel of the array and budget comparisons. The kernel
+    owns scratch buffers that grow to the largest array compared and
+    computes relative errors with in-place ufuncs, so repeated comparisons
+    do not allocate full size temporaries. Errors are calculated in the
+    floating point precision of the compared arrays. Arrays returned by
+    the kernel are views of its buffers and are overwritten by the next
+    call. The kernel returned by CompareKernel.get_shared() is reused by
+    every comparison of a process; kernels are not thread safe.
+    """
+    shared = None
+
+    def __init__(self):
+        self.__nbytes = 0
+        self.__offset_sim = np.empty(0, dtype=np.uint8)
+        self.__offset_valid = np.empty(0, dtype=np.uint8)
+        self.__validate = np.empty(0, dtype=np.uint8)
+        self.__mask = np.empty(0, dtype=bool)
 
-            for key, data in datadict.items():
-                if key in ignore:
-                    pass
-                else:
-                    temp = {}
-                    for ix, point in enumerate(data):
-                        kper = per[ix]
-                        tslen = ts_time[ix]
+    @staticmethod
+    def get_shared():
+        """
+        Method to get the kernel shared by all comparisons
 
-                        if kper in temp:
-                            temp[kper]['data'].append(point)
-                            temp[kper]['tslen'].append(tslen)
-                        else:
-                            temp[kper] = {'data' :[point],
-                                          'tslen':[tslen]}
+        :return: <CompareKernel>
+        """
+        if CompareKernel.shared is None:
+            CompareKernel.shared = CompareKernel()
 
-                    sp_data = self.__calculate_harmonic_mean(temp)
-                    self[fid][key] = sp_data
+        return CompareKernel.shared
 
-            datadict.pop('ts_time')
-            if 'stp' in self.__header:
-                datadict.pop('stp')
-            else:
-                datadict.pop('kstp')
+    @property
+    def nbytes(self):
+        return 3 * self.__nbytes + self.__mask.size
 
-            if timeunit is not None:
-                 time = datadict['delt']
-            else:
-                time = datadict[self.__timeunit]
-
-            new_time = []
-            t = per[0]
-            if timeunit is not None:
-                temp = 0.
-                for ix, kper in enumerate(per):
-                    if kper > t:
-                        t = kper
-                        new_time.append(temp)
-                        temp += time[ix]
-                    else:
-                        temp += time[ix]
+    def release(self):
+        """
+        Method to free the scratch buffers, they are allocated again by
+        the next comparison
+        """
+        self.__init__()
 
-                new_time.append(temp)
-            else:
-                for ix, kper in enumerate(per):
-                    if kper > t:
-                        t = kper
-                        new_time.append(time[ix - 1])
-                    else:
-                        pass
+    def __views(self, shape, dtype):
+        """
+        Method to get scratch buffer views of a shape and dtype, buffers
+        are grown when the views are larger than any seen before
+
+        :param shape: (tuple) array shape
+        :param dtype: (np.dtype) floating point dtype of the views
+        :return: (tuple) offset sim, offset valid, validate and mask views
+        """
+        size = int(np.prod(shape))
+        nbytes = size * dtype.itemsize
+        if nbytes > self.__nbytes:
+            self.__nbytes = nbytes
+            self.__offset_sim = np.empty(nbytes, dtype=np.uint8)
+            self.__offset_valid = np.empty(nbytes, dtype=np.uint8)
+            self.__validate = np.empty(nbytes, dtype=np.uint8)
+
+        if size > self.__mask.size:
+            self.__mask = np.empty(size, dtype=bool)
+
+        views = [buf[:nbytes].view(dtype).reshape(shape) for buf in
+                 (self.__offset_sim, self.__offset_valid, self.__validate)]
+        return tuple(views) + (self.__mask[:size].reshape(shape),)
+
+    def relative_error(self, sim_array, valid_array, offset, absolute=False):
+        """
+        Method to calculate the relative error of offset arrays,
+        ((sim + offset) - (valid + offset)) / (valid + offset)
+
+        :param sim_array: (np.ndarray) simulated values
+        :param valid_array: (np.ndarray) valid values
+        :param offset: (float) offset added to both arrays
+        :param absolute: (bool) offset the absolute values of the arrays
+        :return: (np.ndarray) relative error, a scratch buffer view
+        """
+        # integer arrays are compared in double precision
+        dtype = np.result_type(np.asarray(sim_array).dtype,
+                               np.asarray(valid_array).dtype, np.float32)
+        offset_sim, offset_valid, validate, _ = self.__views(
+            np.shape(valid_array), dtype)
+
+        if absolute:
+            np.abs(sim_array, out=offset_sim)
+            np.add(offset_sim, offset, out=offset_sim)
+            np.abs(valid_array, out=offset_valid)
+            np.add(offset_valid, offset, out=offset_valid)
 
-                new_time.append(time[-1])
+        else:
+            np.add(sim_array, offset, out=offset_sim)
+            np.add(valid_array, offset, out=offset_valid)
 
-            self[fid][self.__timeunit] = new_time
-            self[fid][per_n] = np.arange(1, np.max(per) + 1, dtype=int)
+        np.subtract(offset_sim, offset_valid, out=validate)
+        np.divide(validate, offset_valid, out=validate)
+        return validate
 
-    def keys(self):
-        return [key for key in sorted(self)]
+    def exceeds(self, validate, tolerance):
+        """
+        Method to flag the relative errors greater than a tolerance.
+        Nan errors, from nan or unparsable values, exceed every tolerance.
+        Uses the offset scratch buffers, call after the offset arrays of
+        relative_error() are no longer needed.
+
+        :param validate: (np.ndarray) relative error from relative_error()
+        :param tolerance: (float) tolerance fraction
+        :return: (np.ndarray) boolean mask, a scratch buffer view
+        """
+        work, _, _, mask = self.__views(validate.shape, validate.dtype)
+        np.abs(validate, out=work)
+        np.less_equal(work, tolerance, out=mask)
+        np.logical_not(mask, out=mask)
+        return mask
 
 
-def array_compare(sim_array, valid_array, cell_tol=0.01, array_tol=0.01):
+@profiled('array_compare')
+def array_compare(sim_array, valid_array, cell_tol=0.01, array_tol=0.01,
+                  stream=False, early_exit=True, kernel=None):
     """
     Utility similar to np.allclose to compare modflow output arrays for code
     validation. Used for head comparisons primarily but can be used for any other
     arrays of the same dimension.
 
-    :param sim_array: (np.array) simulation array from new code base
-    :param valid_array: (np.array) valid model solution
+    :param sim_array: (np.array, BinaryHeadArray, ActiveHeadArray) simulation
+        array from new code base
+    :param valid_array: (np.array, BinaryHeadArray, ActiveHeadArray) valid
+        model solution
     :param cell_tol: (float) tolerance fraction for failure when comparing cells
     :param array_tol: (float) tolerance fraction for failure when comparing arrays
+    :param stream: (bool) compare three and four dimensional arrays one
+        layer record at a time instead of loading them whole. Active cell
+        arrays are always compared one time step at a time
+    :param early_exit: (bool) stop a streaming comparison after the first
+        time step with a cell tolerance failure
+    :param kernel: <CompareKernel> instance, defaults to the shared kernel
     :return: (bool) True == Pass, False == Fail
     """
+    if kernel is None:
+        kernel = CompareKernel.get_shared()
 
     if sim_array.shape != valid_array.shape:
         err_msg = "Array shapes are not the same dimension\n"
         ErrorFile.write_error(err_msg)
         return False
 
-    # use small number to ensure there are no divide by zero errors or nan values
-
-    offset_sim_array = sim_array + 1.123456789
-    offset_valid_array = valid_array + 1.123456789
-
-    validate = (offset_sim_array - offset_valid_array) / offset_valid_array
+    if isinstance(sim_array, ActiveHeadArray) or \
+            isinstance(valid_array, ActiveHeadArray):
+        return _array_compare_active(sim_array, valid_array,
+                                     cell_tol=cell_tol,
+                                     array_tol=array_tol,
+                                     early_exit=early_exit,
+                                     kernel=kernel)
+
+    if stream and len(sim_array.shape) in (3, 4):
+        return _array_compare_stream(sim_array, valid_array,
+                                     cell_tol=cell_tol,
+                                     array_tol=array_tol,
+                                     early_exit=early_exit,
+                                     kernel=kernel)
+
+    # materialize lazy arrays such as <BinaryHeadArray> for comparison
+    sim_array = np.asarray(sim_array)
+    valid_array = np.asarray(valid_array)
+
+    # use small number to ensure there are no divide by zero errors or nan
+    # values
+    validate = kernel.relative_error(sim_array, valid_array, 1.123456789)
 
     if np.abs(np.mean(validate)) > array_tol:
         err_msg = "Mean error: {:.2f} is greater than " \
@@ -518,267 +3140,742 @@ def array_compare(sim_array, valid_array, cell_tol=0.01, array_tol=0.01):
         ErrorFile.write_error(err_msg)
         return False
 
-    failure = np.where(np.abs(validate) > cell_tol)
+    failure = np.where(kernel.exceeds(validate, cell_tol))
 
     if failure[0].size > 0:
-        # finds and prints where failure has occured due to cell tolerance
-        err_msg = ""
-        if len(failure) == 4:
-            # four dimensional np.array from cbc
-            kper = failure[0]
-            layer = failure[1]
-            row = failure[2]
-            col = failure[3]
-
-            for failix, per in enumerate(kper):
-                k = layer[failix]
-                i = row[failix]
-                j = col[failix]
-                err_msg += "Array failure: kper: {}, layer: {}, " \
-                           "row: {}, column {}, sim_val: {:.2f}, " \
-                           "valid_val: {:.2f}, " \
-                           "failure criteria : {:.3f}\n".format(per + 1,
-                                                                 k + 1,
-                                                                 i + 1,
-                                                                 j + 1,
-                                                                 sim_array[per, k, i, j],
-                                                                 valid_array[per, k, i, j],
-                                                                 validate[per, k, i, j])
-
-        elif len(failure) == 3:
-            # three dimensional np.array from cbc
-            layer = failure[0]
-            row = failure[1]
-            col = failure[2]
-
-            for failix, k in enumerate(layer):
-                i = row[failix]
-                j = col[failix]
-                err_msg += "Array failure: layer: {}, " \
-                           "row: {}, column {}, sim_val: {:.2f}, " \
-                           "valid_val: {:.2f}, " \
-                           "failure criteria : {:.3f}\n".format(k + 1,
-                                                                 i + 1,
-                                                                 j + 1,
-                                                                 sim_array[k, i, j],
-                                                                 valid_array[k, i, j],
-                                                                 validate[k, i, j])
-
-        elif len(failure) == 2:
-            # this should not happen, but lets catch it anyway
-            row = failure[0]
-            col = failure[1]
-
-            for failix, i in enumerate(row):
-                j = col[failix]
-                err_msg += "Array failure: layer: {}, " \
-                           "column {}, sim_val: {:.2f}, " \
-                           "valid_val: {:.2f}, " \
-                           "failure criteria : {:.3f}\n".format(i + 1,
-                                                                 j + 1,
-                                                                 sim_array[i, j],
-                                                                 valid_array[i, j],
-                                                                 validate[i, j])
-
-        elif len(failure) == 1:
-            # budget items from listing file
-            failed = failure[0]
-            for cell in failed:
-                err_msg += "Array failure: entry number: {}, " \
-                           "sim_val: {:.2f}, valid_val: {:.2f}, " \
-                           "failure criteria : {:.3f}\n".format(cell + 1,
-                                                                 sim_array[cell],
-                                                                 valid_array[cell],
-                                                                 validate[cell])
+        # finds and reports where failure has occured due to cell tolerance
+        report = FailureReport("Array failure", validate.ndim)
+        report.add(failure, sim_array[failure], valid_array[failure],
+                   validate[failure])
+        ErrorFile.write_failures(report)
+
+        return False
+
+    return True
+
+
+def _array_compare_stream(sim_array, valid_array, cell_tol=0.01,
+                          array_tol=0.01, early_exit=True, kernel=None):
+    """
+    Streaming version of array_compare that walks the arrays one
+    (nrow, ncol) layer record at a time. The mean error is accumulated
+    as a running sum and failing cells are reported as they are found,
+    so peak memory is a few layers no matter how large the arrays are.
+
+    :param sim_array: (np.array, BinaryHeadArray) simulation array
+    :param valid_array: (np.array, BinaryHeadArray) valid model solution
+    :param cell_tol: (float) tolerance fraction for failure when comparing
+        cells
+    :param array_tol: (float) tolerance fraction for failure when comparing
+        arrays
+    :param early_exit: (bool) stop after the first failing time step
+    :param kernel: <CompareKernel> instance, defaults to the shared kernel
+    :return: (bool) True == Pass, False == Fail
+    """
+    if kernel is None:
+        kernel = CompareKernel.get_shared()
+
+    shape = sim_array.shape
+    if len(shape) == 3:
+        nper = 1
+        nlay = shape[0]
+
+    else:
+        nper = shape[0]
+        nlay = shape[1]
+
+    total = 0.
+    report = FailureReport("Array failure", len(shape))
+    for per in range(nper):
+        for k in range(nlay):
+            if len(shape) == 3:
+                sim = sim_array[k]
+                valid = valid_array[k]
+
+            else:
+                sim = sim_array[per, k]
+                valid = valid_array[per, k]
+
+            # use small number to ensure there are no divide by zero
+            # errors or nan values
+            validate = kernel.relative_error(sim, valid, 1.123456789)
+            total += validate.sum()
+
+            row, col = np.where(kernel.exceeds(validate, cell_tol))
+
+            if row.size > 0:
+                if len(shape) == 3:
+                    index = (np.full(row.size, k), row, col)
+
+                else:
+                    index = (np.full(row.size, per), np.full(row.size, k),
+                             row, col)
+
+                report.add(index, sim[row, col], valid[row, col],
+                           validate[row, col])
+
+        if len(report) > 0 and early_exit:
+            ErrorFile.write_failures(report)
+            return False
+
+    mean = total / (nper * nlay * shape[-2] * shape[-1])
+    if np.abs(mean) > array_tol:
+        err_msg = "Mean error: {:.2f} is greater than " \
+                  "array tolerance: {:.2f}".format(np.abs(mean), array_tol)
+        ErrorFile.write_error(err_msg)
+        return False
+
+    if len(report) > 0:
+        ErrorFile.write_failures(report)
+        return False
+
+    return True
+
+
+def _array_compare_active(sim_array, valid_array, cell_tol=0.01,
+                          array_tol=0.01, early_exit=True, kernel=None):
+    """
+    Version of array_compare for heads compressed to active cells. Both
+    arrays must share the same active cells, the mean error is taken over
+    active cells only and failing cells are reported by layer, row and
+    column.
+
+    :param sim_array: <ActiveHeadArray> simulation array
+    :param valid_array: <ActiveHeadArray> valid model solution
+    :param cell_tol: (float) tolerance fraction for failure when comparing
+        cells
+    :param array_tol: (float) tolerance fraction for failure when comparing
+        arrays
+    :param early_exit: (bool) stop after the first failing time step
+    :param kernel: <CompareKernel> instance, defaults to the shared kernel
+    :return: (bool) True == Pass, False == Fail
+    """
+    if kernel is None:
+        kernel = CompareKernel.get_shared()
+
+    if not isinstance(sim_array, ActiveHeadArray) or \
+            not isinstance(valid_array, ActiveHeadArray) or \
+            not np.array_equal(sim_array.index, valid_array.index):
+        err_msg = "Arrays do not share the same active cells\n"
+        ErrorFile.write_error(err_msg)
+        return False
+
+    ntime, nactive = valid_array.shape
+    sim = np.empty(nactive, dtype=sim_array.dtype)
+    valid = np.empty(nactive, dtype=valid_array.dtype)
+
+    total = 0.
+    report = FailureReport("Array failure", 4)
+    for per in range(ntime):
+        sim_array.get_time(per, out=sim)
+        valid_array.get_time(per, out=valid)
+
+        # use small number to ensure there are no divide by zero
+        # errors or nan values
+        validate = kernel.relative_error(sim, valid, 1.123456789)
+        total += validate.sum()
+
+        cells = np.flatnonzero(kernel.exceeds(validate, cell_tol))
+        if cells.size > 0:
+            index = (np.full(cells.size, per),) + valid_array.nodes(cells)
+            report.add(index, sim[cells], valid[cells], validate[cells])
+
+            if early_exit:
+                ErrorFile.write_failures(report)
+                return False
+
+    mean = total / max(valid_array.size, 1)
+    if np.abs(mean) > array_tol:
+        err_msg = "Mean error: {:.2f} is greater than " \
+                  "array tolerance: {:.2f}".format(np.abs(mean), array_tol)
         ErrorFile.write_error(err_msg)
+        return False
 
+    if len(report) > 0:
+        ErrorFile.write_failures(report)
         return False
 
     return True
 
 
+@profiled('budget_compare')
 def budget_compare(sim_budget, valid_budget,
                    incremental_tolerance=0.01,
                    budget_tolerance=0.01,
-                   offset=100.):
+                   offset=100.,
+                   kernel=None):
     """
-    Budget comparisons from either list file objects or cbc file objects
+    Budget comparisons from either list file objects or cbc file objects.
+    Every budget term is compared and every failing term is reported,
+    budget items first, then storages and storage differences. List file
+    budgets are compared as one (term x time) matrix.
 
     :param sim_budget: <ListBudget> instance or <CellByCellBudget> instance
     :param valid_budget: <ListBudget> instance or <CellByCellBudget> instance
     :param incremental_tolerance: fraction tolerance for any individual comparison
     :param budget_tolerance: fraction total mean budget tolerance for comparison
     :param offset: (float) small number dampening offset.
+    :param kernel: <CompareKernel> instance, defaults to the shared kernel
     :return: (bool) True == Pass, False == Fail
     """
     if sim_budget.keys() != valid_budget.keys():
         return False
 
-    for test_pass in range(2):
-        # use a two pass approach, first pass is budget items,
-        # second pass is storages and storage differences
-
-        for key in valid_budget.keys():
-
-            if test_pass == 0:
-                if key in ("PERCENT_DISCREPANCY", "IN-OUT",
-                           "STORAGE_IN", "STORAGE_OUT"):
-                     continue
+    if kernel is None:
+        kernel = CompareKernel.get_shared()
+
+    # report budget items first, then storages and storage differences
+    storage = ("IN-OUT", "STORAGE_IN", "STORAGE_OUT")
+    keys = [key for key in valid_budget.keys()
+            if key not in storage and key != "PERCENT_DISCREPANCY"]
+    keys += [key for key in valid_budget.keys() if key in storage]
+
+    if not keys:
+        return True
+
+    if _is_budget_series(sim_budget, valid_budget, keys):
+        return _budget_compare_matrix(sim_budget, valid_budget, keys,
+                                      incremental_tolerance,
+                                      budget_tolerance, offset, kernel)
+
+    passed = True
+    for key in keys:
+        sim_array = sim_budget[key]
+        valid_array = valid_budget[key]
+
+        # lazily loaded budget terms are only held while compared
+        for budget in (sim_budget, valid_budget):
+            if isinstance(budget, CellByCellBudget):
+                budget.release(key)
+
+        index = None
+        if isinstance(sim_array, SparseBudgetTerm) and \
+                isinstance(valid_array, SparseBudgetTerm):
+            # compare list style cbc terms on the union of their cells
+            if sim_array.shape != valid_array.shape:
+                err_msg = "Budget arrays are not compatible: {}\n".format(key)
+                ErrorFile.write_error(err_msg)
+                passed = False
+                continue
 
-            else:
-                if key not in ("IN-OUT", "STORAGE_IN", "STORAGE_OUT"):
-                    continue
+            size = valid_array.size
+            ndim = valid_array.ndim
+            index, sim_array, valid_array = sim_array.align(valid_array)
 
-            sim_array = sim_budget[key]
-            valid_array = valid_budget[key]
+        else:
+            sim_array = np.asarray(sim_array)
+            valid_array = np.asarray(valid_array)
 
             if sim_array.size != valid_array.size:
                 err_msg = "Budget arrays are not compatible: {}\n".format(key)
                 ErrorFile.write_error(err_msg)
-                return False
+                passed = False
+                continue
 
-            # todo: continue thinking about this tolerance issue!
-            # must use a larger offset ~100 to account for differences in small
-            # budget values!
+            size = valid_array.size
+            ndim = valid_array.ndim
 
-            # Not sure that absolute value is appropriate???
-            #   Has the potential for false positives if sign is switched
-            #   Maybe use -50 as an offset criteria cutoff? x < -50; x -= 100
-            #                                               x >= -50; x += 100
+        # todo: continue thinking about this tolerance issue!
+        # must use a larger offset ~100 to account for differences in small
+        # budget values!
 
-            lsim_array = np.abs(sim_array) + offset
-            lvalid_array = np.abs(valid_array) + offset
+        # Not sure that absolute value is appropriate???
+        #   Has the potential for false positives if sign is switched
+        #   Maybe use -50 as an offset criteria cutoff? x < -50; x -= 100
+        #                                               x >= -50; x += 100
 
-            validate = (lsim_array - lvalid_array) / lvalid_array
+        validate = kernel.relative_error(sim_array, valid_array, offset,
+                                         absolute=True)
 
-            if np.abs(np.mean(validate)) > budget_tolerance:
-                err_msg = "Budget item {}: Budget error: {:.2f} " \
-                          "is greater than budget " \
-                          "tolerance: {:.2f}\n".format(key,
-                                                       np.abs(np.mean(validate)),
-                                                       budget_tolerance)
+        # cells missing from both sparse terms have a validate of zero
+        mean = np.sum(validate) / size
+        if not _budget_term_report(key, sim_array, valid_array, validate,
+                                   mean, index, ndim, incremental_tolerance,
+                                   budget_tolerance, kernel):
+            passed = False
 
-                ErrorFile.write_error(err_msg)
+    return passed
 
-                return False
 
-            failure = np.where(np.abs(validate) > incremental_tolerance)
-
-            if failure[0].size > 0:
-                err_msg = ""
-                if len(failure) == 4:
-                    # four dimensional np.array from cbc
-                    kper = failure[0]
-                    layer = failure[1]
-                    row = failure[2]
-                    col = failure[3]
-
-                    for failix, per in enumerate(kper):
-                        k = layer[failix]
-                        i = row[failix]
-                        j = col[failix]
-                        err_msg += "Budget item: {}, kper: {}, layer: {}, " \
-                                   "row: {}, column {}, sim_val: {:.2f}, " \
-                                   "valid_val: {:.2f}, " \
-                                   "failure criteria : {:.3f}\n".format(key,
-                                                                        per + 1,
-                                                                        k + 1,
-                                                                        i + 1,
-                                                                        j + 1,
-                                                                        sim_array[per, k, i, j],
-                                                                        valid_array[per, k, i, j],
-                                                                        validate[per, k, i, j])
-
-                elif len(failure) == 3:
-                    # three dimensional np.array from cbc
-                    layer = failure[0]
-                    row = failure[1]
-                    col = failure[2]
-
-                    for failix, k in enumerate(layer):
-                        i = row[failix]
-                        j = col[failix]
-                        err_msg += "Budget item: {}, layer: {}, " \
-                                   "row: {}, column {}, sim_val: {:.2f}, " \
-                                   "valid_val: {:.2f}, " \
-                                   "failure criteria : {:.3f}\n".format(key,
-                                                                        k + 1,
-                                                                        i + 1,
-                                                                        j + 1,
-                                                                        sim_array[k, i, j],
-                                                                        valid_array[k, i, j],
-                                                                        validate[k, i, j])
-
-                elif len(failure) == 2:
-                    # this should not happen, but lets catch it anyway
-                    row = failure[0]
-                    col = failure[1]
-
-                    for failix, i in enumerate(row):
-                        j = col[failix]
-                        err_msg += "Budget item: {}, layer: {}, " \
-                                   "column {}, sim_val: {:.2f}, " \
-                                   "valid_val: {:.2f}, " \
-                                   "failure criteria : {:.3f}\n".format(key,
-                                                                        i + 1,
-                                                                        j + 1,
-                                                                        sim_array[i, j],
-                                                                        valid_array[i, j],
-                                                                        validate[i, j])
-
-                elif len(failure) == 1:
-                    # budget items from listing file
-                    failed = failure[0]
-                    for cell in failed:
-                        err_msg += "Budget item: {}, entry number: {}, " \
-                                   "sim_val: {:.2f}, valid_val: {:.2f}, " \
-                                   "failure criteria : {:.3f}\n".format(key,
-                                                                        cell + 1,
-                                                                        sim_array[cell],
-                                                                        valid_array[cell],
-                                                                        validate[cell])
-                ErrorFile.write_error(err_msg)
+def _is_budget_series(sim_budget, valid_budget, keys):
+    """
+    Checks if every compared budget term is a time series array of the
+    same length, as in list file budgets
+
+    :param sim_budget: <ListBudget> instance or <CellByCellBudget> instance
+    :param valid_budget: <ListBudget> instance or <CellByCellBudget> instance
+    :param keys: (list) compared budget terms
+    :return: bool
+    """
+    if isinstance(sim_budget, CellByCellBudget) or \
+            isinstance(valid_budget, CellByCellBudget):
+        return False
 
+    sizes = set()
+    for budget in (sim_budget, valid_budget):
+        for key in keys:
+            data = budget[key]
+            if not isinstance(data, np.ndarray) or data.ndim != 1:
                 return False
 
+            sizes.add(data.size)
+
+    return len(sizes) == 1
+
+
+def _budget_compare_matrix(sim_budget, valid_budget, keys,
+                           incremental_tolerance, budget_tolerance, offset,
+                           kernel):
+    """
+    Compares all budget terms of list file budgets as one (term x time)
+    matrix, only failing terms are revisited to report them
+
+    :param sim_budget: <ListBudget> instance
+    :param valid_budget: <ListBudget> instance
+    :param keys: (list) compared budget terms, in report order
+    :param incremental_tolerance: fraction tolerance for any individual
+        comparison
+    :param budget_tolerance: fraction total mean budget tolerance for
+        comparison
+    :param offset: (float) small number dampening offset.
+    :param kernel: <CompareKernel> instance
+    :return: (bool) True == Pass, False == Fail
+    """
+    sim = np.array([sim_budget[key] for key in keys], dtype=np.float64)
+    valid = np.array([valid_budget[key] for key in keys], dtype=np.float64)
+
+    validate = kernel.relative_error(sim, valid, offset, absolute=True)
+
+    means = np.sum(validate, axis=1) / valid.shape[1]
+    failed = ~(np.abs(means) <= budget_tolerance) | \
+        np.any(kernel.exceeds(validate, incremental_tolerance), axis=1)
+
+    for row in np.flatnonzero(failed):
+        _budget_term_report(keys[row], sim[row], valid[row], validate[row],
+                            means[row], None, 1, incremental_tolerance,
+                            budget_tolerance, kernel)
+
+    return not np.any(failed)
+
+
+def _budget_term_report(key, sim_array, valid_array, validate, mean, index,
+                        ndim, incremental_tolerance, budget_tolerance,
+                        kernel):
+    """
+    Writes the failures of a single budget term to the error file
+
+    :param key: (str) budget term name
+    :param sim_array: (np.ndarray) simulated values
+    :param valid_array: (np.ndarray) valid values
+    :param validate: (np.ndarray) relative error of each value
+    :param mean: (float) mean relative error of the budget term
+    :param index: (tuple) dense index of each value of an aligned sparse
+        budget term, None if the values are dense
+    :param ndim: (int) number of dimensions of the budget term
+    :param incremental_tolerance: fraction tolerance for any individual
+        comparison
+    :param budget_tolerance: fraction total mean budget tolerance for
+        comparison
+    :param kernel: <CompareKernel> instance that calculated validate
+    :return: (bool) True == Pass, False == Fail
+    """
+    # a nan mean, from nan budget values, fails
+    if not np.abs(mean) <= budget_tolerance:
+        err_msg = "Budget item {}: Budget error: {:.2f} " \
+                  "is greater than budget " \
+                  "tolerance: {:.2f}\n".format(key,
+                                               np.abs(mean),
+                                               budget_tolerance)
+
+        ErrorFile.write_error(err_msg)
+
+        return False
+
+    cells = np.where(kernel.exceeds(validate, incremental_tolerance))
+
+    if cells[0].size > 0:
+        if index is None:
+            failure = cells
+
+        else:
+            failure = tuple(ix[cells[0]] for ix in index)
+
+        report = FailureReport("Budget item: {}".format(key), ndim)
+        report.add(failure, sim_array[cells], valid_array[cells],
+                   validate[cells])
+        ErrorFile.write_failures(report)
+
+        return False
+
     return True
 
 
+@profiled('farm_outputs_compare')
 def farm_outputs_compare(sim_budget, valid_budget,
                          incremental_tolerance=0.01,
                          budget_tolerance=0.01,
-                         offset=100.):
+                         offset=100., kernel=None):
     """
     Budget comparisions from farm process output files such as FBDETAILS and
-    FDS.OUT
+    FDS.OUT. All farms are stacked into a single (farm x item x period)
+    array and compared in one vectorized pass by the comparison kernel,
+    every failing farm and budget item is reported in a summary. Periods
+    past the end of a shorter farm record are zero in both arrays and have
+    no error.
+
     :param sim_budget: <FarmOutputs> class object
     :param valid_budget: <FarmOutputs> class object
     :param incremental_tolerance: (float) fraction tolerance for each budget item
     :param budget_tolerance: (float) mean tolerance for full budget item
     :param offset: (float) small number dampening offset.
+    :param kernel: <CompareKernel> instance, defaults to the shared kernel
     :return: True == Pass, False == Fail
     """
+    if kernel is None:
+        kernel = CompareKernel.get_shared()
+
     if sim_budget.keys() != valid_budget.keys():
         ErrorFile.write_error("Farm numbers do not match")
         return False
 
+    fids = valid_budget.keys()
+    if not fids:
+        return True
+
+    items = sorted(valid_budget[fids[0]])
+    for fid in fids:
+        if sorted(sim_budget[fid]) != items or \
+                sorted(valid_budget[fid]) != items:
+            err_msg = "Farm budget items do not match: farm {}\n".format(fid)
+            ErrorFile.write_error(err_msg)
+            return False
+
+    # string columns such as crop_name are not budget items
+    items = [item for item in items
+             if np.asarray(valid_budget[fids[0]][item]).dtype.kind in "iuf"]
+
+    nper = max([np.size(valid_budget[fid][item])
+                for fid in fids for item in items] + [0])
+    if nper == 0:
+        return True
+
+    sim = np.zeros((len(fids), len(items), nper))
+    valid = np.zeros((len(fids), len(items), nper))
+    nvalues = np.zeros((len(fids), len(items)), dtype=int)
+    for fx, fid in enumerate(fids):
+        for ix, item in enumerate(items):
+            sim_array = np.ravel(sim_budget[fid][item])
+            valid_array = np.ravel(valid_budget[fid][item])
+            if sim_array.size != valid_array.size:
+                err_msg = "Budget arrays are not compatible: farm {}, " \
+                          "{}\n".format(fid, item)
+                ErrorFile.write_error(err_msg)
+                return False
+
+            sim[fx, ix, :sim_array.size] = sim_array
+            valid[fx, ix, :valid_array.size] = valid_array
+            nvalues[fx, ix] = valid_array.size
+
+    validate = kernel.relative_error(sim, valid, offset, absolute=True)
+    mean = np.sum(validate, axis=2) / np.maximum(nvalues, 1)
+    nfail = np.sum(kernel.exceeds(validate, incremental_tolerance), axis=2)
+
+    # the stacked sim array is no longer needed and holds the absolute errors
+    worst = np.argmax(np.abs(validate, out=sim), axis=2)
+    criteria = np.take_along_axis(validate, worst[:, :, np.newaxis],
+                                  axis=2)[:, :, 0]
+
+    failed = (np.abs(mean) > budget_tolerance) | (nfail > 0)
+    if not np.any(failed):
+        return True
+
+    fx, ix = np.where(failed)
+    order = np.argsort(-np.abs(criteria[fx, ix]), kind='mergesort')
+    order = order[:FailureReport.top_n]
+
+    err_msg = "Farm budget failure: {} of {} farm budget items failed, " \
+              "{} worst shown\n".format(fx.size, failed.size, order.size)
+    line = "Farm budget failure: farm: %s, budget item: %s, " \
+           "mean error: %.3f, failed periods: %d of %d, worst kper: %d, " \
+           "failure criteria : %.3f\n"
+    values = zip([str(fids[f]) for f in fx[order]],
+                 [items[i] for i in ix[order]],
+                 mean[fx, ix][order].tolist(),
+                 nfail[fx, ix][order].tolist(),
+                 nvalues[fx, ix][order].tolist(),
+                 (worst[fx, ix][order] + 1).tolist(),
+                 criteria[fx, ix][order].tolist())
+    err_msg += (line * order.size) % tuple(
+        itertools.chain.from_iterable(values))
+
+    counts = np.sum(failed, axis=0)
+    pairs = ["{}: {}".format(items[i], counts[i])
+             for i in np.flatnonzero(counts)]
+    err_msg += "Farm budget failure: failed farms per budget " \
+               "item: {}\n".format(", ".join(pairs))
+    ErrorFile.write_error(err_msg)
+
+    return False
+
+
+@profiled('swr_compare')
+def swr_compare(sim_swr, valid_swr, cell_tol=0.01, array_tol=0.01,
+                offset=1.123456789, early_exit=True,
+                chunk_size=4 * 1024 ** 2, kernel=None):
+    """
+    Comparison of SWR process binary outputs. The files are compared a
+    range of time steps at a time as (time x item x value) arrays read
+    from the memory maps, so peak memory stays near chunk_size no matter
+    how long the simulation is. Each value, such as stage or flow, is
+    checked against the cell and mean tolerances and reported separately.
+
+    :param sim_swr: <SwrBinaryFile> simulation output from new code base
+    :param valid_swr: <SwrBinaryFile> valid model solution
+    :param cell_tol: (float) tolerance fraction for failure when comparing
+        items
+    :param array_tol: (float) tolerance fraction for the mean error of a value
+    :param offset: (float) small number dampening offset, added to the
+        absolute values so flows of either sign are compared
+    :param early_exit: (bool) stop after the first range of time steps
+        with a cell tolerance failure
+    :param chunk_size: (int) bytes of values of each file compared at a time
+    :param kernel: <CompareKernel> instance, defaults to the shared kernel
+    :return: (bool) True == Pass, False == Fail
+    """
+    if kernel is None:
+        kernel = CompareKernel.get_shared()
+
+    if sim_swr.swrtype != valid_swr.swrtype or \
+            sim_swr.nrecord != valid_swr.nrecord:
+        err_msg = "SWR output types or record counts are not the same\n"
+        ErrorFile.write_error(err_msg)
+        return False
 
-    for key in sim_budget.keys():
-        t = budget_compare(sim_budget[key], valid_budget[key],
-                           incremental_tolerance=incremental_tolerance,
-                           budget_tolerance=budget_tolerance,
-                           offset=offset)
+    if sim_swr.ntime != valid_swr.ntime or \
+            not np.array_equal(sim_swr.counts, valid_swr.counts):
+        err_msg = "SWR outputs do not have the same time steps and " \
+                  "items\n"
+        ErrorFile.write_error(err_msg)
+        return False
 
-        if not t:
-            return t
+    if valid_swr.connectivity is not None and \
+            not np.array_equal(sim_swr.connectivity, valid_swr.connectivity):
+        ErrorFile.write_error("SWR flow connectivity is not the same\n")
+        return False
 
-    return True
+    if not np.allclose(sim_swr.totim, valid_swr.totim, rtol=cell_tol,
+                       atol=0.):
+        ErrorFile.write_error("SWR output times are not the same\n")
+        return False
+
+    names = valid_swr.names
+    reports = [FailureReport("SWR {} failure".format(name), 2,
+                             names=("time step", valid_swr.item_name))
+               for name in names]
+    total = np.zeros(len(names))
+    nitem = 0
+    stopped = False
+    for t0, t1 in valid_swr.chunks(chunk_size):
+        if valid_swr.swrtype == 'exchange' and \
+                not np.array_equal(sim_swr.get_layers(t0, t1),
+                                   valid_swr.get_layers(t0, t1)):
+            ErrorFile.write_error("SWR exchange layers are not the same\n")
+            return False
+
+        sim = sim_swr.get_values(t0, t1)
+        valid = valid_swr.get_values(t0, t1)
+        validate = kernel.relative_error(sim, valid, offset, absolute=True)
+        total += validate.sum(axis=(0, 1))
+        nitem += validate.shape[0] * validate.shape[1]
+
+        time, item, value = np.nonzero(kernel.exceeds(validate, cell_tol))
+        for ix in np.unique(value):
+            t = time[value == ix]
+            i = item[value == ix]
+            reports[ix].add((t + t0, i), sim[t, i, ix], valid[t, i, ix],
+                            validate[t, i, ix])
+
+        if time.size > 0 and early_exit:
+            stopped = True
+            break
+
+    passed = True
+    for name, mean, report in zip(names, total / max(nitem, 1), reports):
+        # the mean error is only known once every time step is compared
+        if not stopped and np.abs(mean) > array_tol:
+            err_msg = "SWR {} mean error: {:.2f} is greater than " \
+                      "array tolerance: {:.2f}\n".format(name, np.abs(mean),
+                                                         array_tol)
+            ErrorFile.write_error(err_msg)
+            passed = False
+
+        if len(report) > 0:
+            ErrorFile.write_failures(report)
+            passed = False
+
+    return passed
+
+
+def _is_record_text(s):
+    """
+    Checks that a 16 byte binary record label is printable text
+
+    :param s: (bytes) record label
+    :return: bool
+    """
+    return len(s) == 16 and \
+        all(32 <= c < 127 for c in bytearray(s)) and \
+        any(chr(c).isalpha() for c in bytearray(s))
+
+
+def get_head_precision(filename):
+    """
+    Detects the floating point precision of a MODFLOW binary head file
+    from the position of the text label in the first record header.
+
+    :param filename: (str) binary head file path
+    :return: (str) single or double, None if precision cannot be found
+    """
+    with open(filename, 'rb') as f:
+        header = f.read(52)
+
+    return _head_precision(header)
+
+
+def _head_precision(header):
+    """
+    Detects the floating point precision of the first record header of a
+    MODFLOW binary head file
+
+    :param header: (bytes) first bytes of the file, at least 52 bytes for
+        double precision
+    :return: (str) single or double, None if precision cannot be found
+    """
+    for precision, ioff in (('single', 16), ('double', 24)):
+        if len(header) < ioff + 28:
+            continue
 
+        dims = np.frombuffer(header, dtype='<i4', count=3, offset=ioff + 16)
+        if _is_record_text(header[ioff:ioff + 16]) and np.all(dims > 0):
+            return precision
 
-def get_file_names(ws, filter=".lst"):
-    return [f for f in os.listdir(ws)
-            if os.path.isfile(os.path.join(ws, f))
-            and f.lower().endswith(filter.lower())]
+    return None
+
+
+def get_budget_precision(filename):
+    """
+    Detects the floating point precision of a MODFLOW cell by cell budget
+    file by sizing the first record under each precision and checking
+    that the next record label (or the end of file) follows it.
+
+    :param filename: (str) binary budget file path
+    :return: (str) single or double, None if precision cannot be found
+    """
+    filesize = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        header = f.read(36)
+        if len(header) < 36 or not _is_record_text(header[8:24]):
+            return None
+
+        ncol, nrow, nlay = [int(i) for i in
+                            np.frombuffer(header, dtype='<i4',
+                                          count=3, offset=24)]
+        ncell = ncol * nrow * abs(nlay)
+
+        for precision, nbyte in (('single', 4), ('double', 8)):
+            if nlay > 0:
+                pos = 36 + ncell * nbyte
+
+            else:
+                pos = 36 + 4 + 3 * nbyte
+                f.seek(36)
+                imeth = int(np.frombuffer(f.read(4), dtype='<i4')[0])
+
+                if imeth in (0, 1):
+                    pos += ncell * nbyte
+
+                elif imeth == 2:
+                    f.seek(pos)
+                    nlist = int(np.frombuffer(f.read(4), dtype='<i4')[0])
+                    pos += 4 + nlist * (4 + nbyte)
+
+                elif imeth == 3:
+                    pos += ncol * nrow * (4 + nbyte)
+
+                elif imeth == 4:
+                    pos += ncol * nrow * nbyte
+
+                elif imeth == 5:
+                    f.seek(pos)
+                    naux = int(np.frombuffer(f.read(4), dtype='<i4')[0]) - 1
+                    pos += 4 + naux * 16
+                    f.seek(pos)
+                    nlist = int(np.frombuffer(f.read(4), dtype='<i4')[0])
+                    pos += 4 + nlist * (4 + (naux + 1) * nbyte)
+
+                else:
+                    return None
+
+            if pos == filesize:
+                return precision
+
+            if pos + 24 <= filesize:
+                f.seek(pos + 8)
+                if _is_record_text(f.read(16)):
+                    return precision
+
+    return None
+
+
+def get_file_names(ws, filter=".lst", classes=None):
+    """
+    Method to get the names of the files of a workspace that end with a
+    pattern, from the session WorkspaceIndex of the workspace
+
+    :param ws: (str) workspace
+    :param filter: (str) case insensitive file name ending
+    :param classes: (list) optional WorkspaceIndex file classes to keep,
+        files of an unknown type (binary, text) are always kept
+    :return: (list) file names
+    """
+    filter = filter.lower()
+    return [f for f, kind in WorkspaceIndex.get(ws).items()
+            if f.lower().endswith(filter)
+            and (classes is None or kind in classes
+                 or kind in ('binary', 'text'))]
+
+
+@profiled('identical_outputs')
+def identical_outputs(sim_ws, valid_ws, name, chunk_size=4 * 1024 ** 2):
+    """
+    Checks if an output file is byte for byte identical in two
+    workspaces. File sizes are compared first and file contents are then
+    compared chunk by chunk, stopping at the first differing chunk, so
+    differing files are usually rejected after reading a single chunk.
+
+    :param sim_ws: (str) simulated output workspace
+    :param valid_ws: (str) valid output workspace
+    :param name: (str) output file name
+    :param chunk_size: (int) number of bytes read per chunk
+    :return: bool, False if either file is missing
+    """
+    sim_file = os.path.join(sim_ws, name)
+    valid_file = os.path.join(valid_ws, name)
+    try:
+        if os.path.getsize(sim_file) != os.path.getsize(valid_file):
+            return False
+
+        with open(sim_file, 'rb') as sim, open(valid_file, 'rb') as valid:
+            while True:
+                chunk = sim.read(chunk_size)
+                if chunk != valid.read(chunk_size):
+                    return False
+
+                if not chunk:
+                    return True
+
+    except (IOError, OSError):
+        return False
 
 
 if __name__ == "__main__":